@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+# Script to validate the data of DwC-DP data packages - a datapackage.json and
+# its CSV/TSV resource files - against the table schemas in dwc-dp/table-schemas
+#
+# find all datapackage.json files under the given directories
+# verify each resource has a table schema
+# verify each resource file's header matches the fields of its table schema
+# verify column counts, quoting and UTF-8 encoding of every row
+# verify integer, number and boolean values, required values, minimum and maximum
+# verify the values of primary keys and unique fields are not repeated, and where
+#   each repeated value first occurs
+# verify the values of foreign keys are values of the keys they reference, and
+#   warn about those of weak foreign keys that are not
+# warn about byte order marks, carriage returns and control characters
+# return a failing process exit code if any errors were found
+#
+# The files are streamed, not loaded, and checked concurrently (--jobs), large
+# ones in line-aligned ranges; the key values of each file or range, and those
+# joined for each referenced key, are kept within --key-memory, beyond which
+# they spill to disk. See data_validation.py.
+#
+# Usage: python data-packages-validation-checks-data.py [--schemas-dir DIR] [--jobs N] [--key-memory MIB] path/to/package [...]
+
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import data_validation
+import validation_engine as engine
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate the data of DwC-DP data packages")
+    parser.add_argument('packages', nargs='+',
+                        help="Data package directories, searched for datapackage.json files")
+    parser.add_argument('--schemas-dir', type=Path, default=data_validation.DEFAULT_SCHEMAS_DIR,
+                        help=f"Directory of DwC-DP table schemas "
+                             f"(default: {data_validation.DEFAULT_SCHEMAS_DIR})")
+    parser.add_argument('-j', '--jobs', type=int, default=data_validation.scanner.default_jobs(),
+                        help="Resource files, or ranges of large ones, to check at a time (default: available CPU cores)")
+    parser.add_argument('--key-memory', type=int, default=data_validation.KEY_MEMORY // 2**20, metavar='MIB',
+                        help="Memory for the key values of each resource file or range being checked, and of each "
+                             "referenced key being joined with its foreign keys, beyond which they "
+                             "spill to disk (default: %(default)s MiB)")
+    parser.add_argument('--spill-dir',
+                        help="Directory for the key values spilled to disk (default: the system temporary directory)")
+    args = parser.parse_args()
+    engine.check_arguments(parser, args)
+    if not args.schemas_dir.is_dir():
+        parser.error(f"Not a directory: {args.schemas_dir}")
+    if args.key_memory < 1:
+        parser.error("--key-memory must be at least 1")
+    if args.spill_dir is not None and not Path(args.spill_dir).is_dir():
+        parser.error(f"Not a directory: {args.spill_dir}")
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        passes = data_validation.data_passes(args.schemas_dir, executor,
+                                             args.key_memory * 2**20, args.spill_dir, args.jobs)
+        status = engine.run(args.packages, passes, args.jobs, descriptor='datapackage.json')
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
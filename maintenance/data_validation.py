@@ -0,0 +1,868 @@
+#
+# Validation of the data of DwC-DP data packages, as opposed to their table
+# schemas (see validation_engine.py). Every CSV/TSV resource listed in a
+# datapackage.json is checked against its table schema from
+# dwc-dp/table-schemas: the header, column counts, encoding, integer, number
+# and boolean types, required, minimum and maximum, with the single-pass
+# checks of tools/diagnose_tsv.py, and primary keys and unique constraints
+# with KeyCheck. The foreign keys between the tables are then checked on the
+# values, as check_foreign_keys checks their declarations, from the key
+# values logged while the files are checked (see check_references).
+#
+# Each file is read once, as memory-mapped binary blocks checked a column at
+# a time, never parsed row by row; the resource files are checked
+# concurrently in a pool of worker processes, large ones split into
+# line-aligned ranges whose results are merged (see merge_ranges), and so
+# are the foreign keys.
+# Memory does not depend on the size of a file: the values of each key are
+# logged once as digests within a memory budget, beyond which they spill to
+# disk (see KeyLog), and searched for duplicates or joined a partition of
+# the digests at a time.
+#
+# The checks run as passes of the validation engine (see data_passes), so
+# table schemas are parsed once per run whatever the number of packages.
+
+import bisect
+import functools
+import hashlib
+import heapq
+import shutil
+import struct
+import sys
+import tempfile
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, as_completed
+from itertools import chain, compress, count, islice
+from operator import eq, itemgetter, not_
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from validation_engine import Documents, Pass, ValidationResult, load_package
+
+# diagnose_tsv.py is in the tools folder
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'tools'))
+
+import diagnose_tsv as scanner
+
+# Default location of the DwC-DP table schemas
+DEFAULT_SCHEMAS_DIR = scanner.DEFAULT_SCHEMAS_DIR
+
+# Bytes of the BLAKE2b digest kept for each value of a key
+DIGEST_SIZE = 16
+
+# A logged key value: its digest, byte offset and line number
+RECORD = struct.Struct(f'>{DIGEST_SIZE}sQQ')
+
+# Bytes of memory a record takes while its partition is sorted
+LOADED_RECORD_SIZE = 192
+
+# Partitions of the logged key values, by the first byte of their digest
+PARTITIONS = 256
+
+# Default bytes of memory for the key values of a resource file
+KEY_MEMORY = 1024 * 1024 * 1024
+
+# Locations shown for each kind of problem in a resource file
+EXAMPLES = 3
+
+# Rules reported as warnings rather than errors: Frictionless reads such files
+WARNING_RULES = {'bom', 'carriage-return', 'control-char'}
+
+
+class Resource(NamedTuple):
+    """A resource file of a data package and what to check it against."""
+    name: str
+    path: Path
+    schema: dict | None
+    dialect: scanner.Dialect
+
+
+# ---------------------------------------------------------------------------
+# Checks
+# ---------------------------------------------------------------------------
+
+class KeyLog:
+    """
+    The values of one key of a table file, logged to *directory* to be
+    searched for duplicates (see duplicates) and joined with those of other
+    keys (see check_references).
+
+    Each value is logged as a record of its DIGEST_SIZE-byte BLAKE2b digest,
+    byte offset and line number, appended to one of PARTITIONS buffers by
+    the first byte of the digest. When the buffers outgrow *memory* bytes
+    they are appended to one file per partition in *directory* and emptied;
+    spill() writes out the rest once the file has been fed. Memory therefore
+    stays within *memory* whatever the number of values, for as much disk
+    space as the records take.
+    """
+
+    # Copied for each value, which is cheaper than making a new hash object
+    HASH = hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+    def __init__(self, directory: Path, memory: int = KEY_MEMORY):
+        self.directory = directory
+        self.memory = memory
+        self.parts = [bytearray() for _ in range(PARTITIONS)]
+        self.buffered = 0
+
+    def add(self, values: Iterable[bytes], lines: Iterable[int], offsets: Iterable[int]) -> None:
+        """Log the non-empty *values* of a block, found at *lines* and byte *offsets*."""
+        parts = self.parts
+        pack = RECORD.pack
+        copy = self.HASH.copy
+        added = 0
+        for value, line, offset in zip(values, lines, offsets):
+            if value:
+                h = copy()
+                h.update(value)
+                digest = h.digest()
+                parts[digest[0]] += pack(digest, offset, line)
+                added += 1
+        self.buffered += added * RECORD.size
+        if self.buffered > self.memory:
+            self.spill()
+
+    def spill(self) -> None:
+        """Append the buffered records to the partition files."""
+        for n, part in enumerate(self.parts):
+            if part:
+                with open(self.directory / f'{n:02x}', 'ab') as f:
+                    f.write(part)
+                part.clear()
+        self.buffered = 0
+
+
+def read_records(path: Path, memory: int) -> Iterator[bytes]:
+    """Yield the records of file *path*, if it exists, in chunks of at most a quarter of *memory* bytes."""
+    if not path.exists():
+        return
+    chunk = RECORD.size * max(1, memory // (4 * RECORD.size))
+    with open(path, 'rb') as f:
+        while data := f.read(chunk):
+            yield data
+
+
+def split_records(paths: list[Path], depth: int, directory: Path, prefix: str, memory: int) -> list[Path]:
+    """
+    Append the records of the files *paths* to PARTITIONS files of
+    *directory*, named *prefix* and a digest byte, by byte *depth* of their
+    digests. Returns the paths of the partition files, some of which may
+    not exist.
+    """
+    size = RECORD.size
+    parts = [bytearray() for _ in range(PARTITIONS)]
+    outputs = [directory / f'{prefix}{n:02x}' for n in range(PARTITIONS)]
+    for data in chain.from_iterable(read_records(path, memory) for path in paths):
+        for i in range(0, len(data), size):
+            parts[data[i + depth]] += data[i:i + size]
+        for part, output in zip(parts, outputs):
+            if part:
+                with open(output, 'ab') as f:
+                    f.write(part)
+                part.clear()
+    return outputs
+
+
+def fitting_partitions(
+    streams: list[list[Path]],
+    memory: int,
+    scratch: Path,
+    depth: int,
+) -> Iterator[list[list[Path]]]:
+    """
+    Yield *streams*, lists of record files whose digests share their first
+    *depth* bytes, if the records of the first stream fit in *memory* once
+    loaded; otherwise split every stream on the next digest byte, through
+    files in *scratch*, and yield the partitions that fit. The files of
+    *streams* are left as they are.
+    """
+    size = sum(path.stat().st_size for path in streams[0] if path.exists())
+    if size // RECORD.size * LOADED_RECORD_SIZE <= memory or depth == DIGEST_SIZE:
+        yield streams
+        return
+
+    directory = Path(tempfile.mkdtemp(dir=scratch))
+    try:
+        parts = [
+            split_records(stream, depth, directory, f'{n}-', memory)
+            for n, stream in enumerate(streams)
+        ]
+        for i in range(PARTITIONS):
+            yield from fitting_partitions([[part[i]] for part in parts], memory, directory, depth + 1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def sorted_duplicates(data: bytes) -> Iterator[tuple[int, int, int, int]]:
+    """
+    Yield (line, offset, first line, first offset) for each record of *data*
+    whose digest an earlier record has. Sorting the records brings equal
+    digests together, in file order.
+    """
+    size = RECORD.size
+    records = sorted(data[i:i + size] for i in range(0, len(data), size))
+    digests = list(map(itemgetter(slice(0, DIGEST_SIZE)), records))
+    first = None
+    for i in compress(count(1), map(eq, digests, islice(digests, 1, None))):
+        if first is None or digests[first] != digests[i]:
+            first = i - 1
+        _, offset, line = RECORD.unpack(records[i])
+        _, first_offset, first_line = RECORD.unpack(records[first])
+        yield line, offset, first_line, first_offset
+
+
+def duplicates(directories: list[Path], memory: int, scratch: Path) -> Iterator[tuple[int, int, int, int]]:
+    """
+    Yield (line, offset, first line, first offset) for each value logged in
+    the KeyLogs of *directories* after an equal one, which is the first
+    occurrence of the value, in no particular order. The records are sorted
+    a partition at a time, split further through *scratch* where a partition
+    does not fit in *memory* (see fitting_partitions).
+    """
+    for n in range(PARTITIONS):
+        name = f'{n:02x}'
+        for (paths,) in fitting_partitions([[directory / name for directory in directories]], memory, scratch, 1):
+            yield from sorted_duplicates(b''.join(chain.from_iterable(read_records(path, memory) for path in paths)))
+
+
+class LineShifts(NamedTuple):
+    """
+    The byte offsets at which the ranges of a file checked in parts start,
+    and the number of lines before each, to turn the line numbers of their
+    key logs, which count from 1 at the start of each range, into line
+    numbers of the file.
+    """
+    starts: list[int]
+    shifts: list[int]
+
+    def line(self, line: int, offset: int) -> int:
+        """Return the line number in the file of *line* of the range holding byte *offset*."""
+        return line + self.shifts[bisect.bisect_right(self.starts, offset) - 1]
+
+
+def key_values(rows: list[list[bytes]], columns: list[int]) -> Iterable[bytes]:
+    """
+    Return the values of the key in *columns* of each of *rows*: the cell of
+    a single column, or the cells of several joined by NUL bytes. A key with
+    an empty cell is empty, as in Frictionless.
+    """
+    if len(columns) == 1:
+        return map(itemgetter(columns[0]), rows)
+    return (b'\x00'.join(cells) if all(cells) else b'' for cells in map(itemgetter(*columns), rows))
+
+
+def table_keys(schema: dict | None) -> list[tuple[str, ...]]:
+    """Return the field names of the primary key and of each unique field of a table schema."""
+    schema = schema or {}
+    keys = []
+    primary_key = schema.get('primaryKey')
+    if primary_key:
+        keys.append(tuple([primary_key] if isinstance(primary_key, str) else primary_key))
+    keys += [
+        (field['name'],) for field in schema.get('fields', [])
+        if (field.get('constraints') or {}).get('unique')
+    ]
+    return list(dict.fromkeys(keys))
+
+
+class KeyCheck(scanner.Check):
+    """
+    Logs the values of the keys of a table file, or of a range of it, each
+    to a KeyLog in a numbered subdirectory of *directory*, and checks those
+    of its primary key and unique fields, *unique*, for repeated values.
+    Rows with an empty key field are left out, as in Frictionless.
+
+    The keys logged are *unique* and the keys *joined* by foreign keys (see
+    KeyLogs), each logged once whatever it is for. The logs share *memory*
+    bytes; finish() writes them out once the range has been fed, and they
+    are not pickled with the check. The logs of the ranges of a file are not
+    merged but searched together: once the checks of every range are merged,
+    search() looks for repeated values of the unique keys across them, and
+    leaves only the logs of the joined keys on disk, for check_references.
+    """
+
+    def __init__(
+        self,
+        unique: list[tuple[str, ...]],
+        joined: list[tuple[str, ...]],
+        directory: str,
+        limit: int | None = None,
+        memory: int = KEY_MEMORY,
+    ):
+        super().__init__(limit)
+        self.keys = list(dict.fromkeys(unique + joined))
+        self.unique = unique
+        self.joined = joined
+        self.directory = directory
+        self.memory = memory
+        self.width = 0
+        # The column of the first field of each key, or None if a field is not in the header
+        self.columns: list[int | None] = [None] * len(self.keys)
+        self.logs: dict[int, tuple[KeyLog, list[int]]] = {}
+        # key -> number of repeated values
+        self.repeats: dict[tuple[str, ...], int] = {}
+        # (line, offset, column, key, first line) of the first repeated values
+        self.found: list[tuple[int, int, int, tuple[str, ...], int]] = []
+
+    def __getstate__(self):
+        return {**self.__dict__, 'logs': {}}
+
+    def header(self, cells):
+        cells = [cells[0].removeprefix(scanner.UTF8_BOM)] + cells[1:]
+        labels = [cell.decode('utf-8', 'replace') for cell in cells]
+        self.width = len(labels)
+        present = [k for k, key in enumerate(self.keys) if all(name in labels for name in key)]
+        memory = self.memory // max(1, len(present))
+        for k in present:
+            columns = [labels.index(name) for name in self.keys[k]]
+            self.columns[k] = columns[0] + 1
+            directory = Path(self.directory) / str(k)
+            directory.mkdir(parents=True, exist_ok=True)
+            self.logs[k] = KeyLog(directory, memory), columns
+
+    def feed(self, block):
+        if not self.logs:
+            return
+        index = block.row_index(self.width)
+        if not index:
+            return
+
+        rows = block.rows(index, max(column for _, columns in self.logs.values() for column in columns) + 1)
+        lines, offsets = block.locate_rows(index)
+        for log, columns in self.logs.values():
+            log.add(key_values(rows, columns), lines, offsets)
+
+    def finish(self) -> None:
+        """Write out the logs."""
+        for log, _ in self.logs.values():
+            log.spill()
+
+    def close(self) -> None:
+        """Drop the logs, leaving their files for search()."""
+        self.logs = {}
+
+    def search(self, directories: list[Path], lines: LineShifts) -> None:
+        """
+        Search the logs of the unique keys in *directories*, those of the
+        ranges of the file in order, for repeated values, keeping the first
+        ones found at their lines in the file, and remove the logs of the keys
+        not joined. The records are sorted in the parent directory of the
+        logs when they do not fit in memory (see duplicates).
+        """
+        for k, key in enumerate(self.keys):
+            if self.columns[k] is None:
+                continue
+            logs = [directory / str(k) for directory in directories]
+            if key in self.unique:
+                for line, offset, first_line, first_offset in duplicates(logs, self.memory, directories[0].parent):
+                    self.repeats[key] = self.repeats.get(key, 0) + 1
+                    self.found.append((lines.line(line, offset), offset, self.columns[k], key,
+                                       lines.line(first_line, first_offset)))
+                    if len(self.found) > 4 * self.keep + 16:
+                        self.found = heapq.nsmallest(self.keep, self.found)
+            if key not in self.joined:
+                for log in logs:
+                    shutil.rmtree(log, ignore_errors=True)
+        self.found = heapq.nsmallest(self.keep, self.found)
+
+    @property
+    def ok(self):
+        return not self.repeats
+
+    def report(self):
+        for key, repeats in sorted(self.repeats.items()):
+            lines = ", ".join(f"{line} (as line {first_line})" for line, _, _, k, first_line in self.found if k == key)
+            print(f"❗ {', '.join(key)}: {repeats} repeated values of a unique key (e.g., lines {lines})")
+
+    def counts(self):
+        total = sum(self.repeats.values())
+        return {'schema-unique': total} if total else {}
+
+    def findings(self):
+        return [
+            scanner.finding('schema-unique', line, offset, column, field=', '.join(key), repeats=first_line)
+            for line, offset, column, key, first_line in self.found
+        ]
+
+
+def make_checks(
+    schema: dict | None,
+    dialect: scanner.Dialect,
+    limit: int | None = EXAMPLES,
+    joined: list[tuple[str, ...]] = (),
+    directory: str | None = None,
+    memory: int = KEY_MEMORY,
+) -> list[scanner.Check]:
+    """
+    Return the checks to run over a resource file, in reporting order: with
+    a log *directory*, the key checks of its unique keys and of the *joined*
+    keys (see KeyCheck).
+    """
+    checks = scanner.make_checks(schema, dialect, limit)
+    unique = table_keys(schema) if schema is not None else []
+    if directory is not None and (unique or joined):
+        checks.append(KeyCheck(unique, list(joined), directory, limit, memory))
+    return checks
+
+
+# ---------------------------------------------------------------------------
+# Validation passes
+# ---------------------------------------------------------------------------
+
+def load_schema(
+    resource: dict,
+    schemas_dir: Path,
+    documents: Documents,
+    result: ValidationResult,
+) -> dict | None:
+    """
+    Return the table schema of a datapackage.json *resource*: its inline
+    schema, or the schema of *schemas_dir* named by its schema URL or,
+    failing that, by its name.
+    """
+    declared = resource.get('schema')
+    if isinstance(declared, dict):
+        return declared
+    name = resource.get('name', '<unnamed>')
+    tables = [Path(urlparse(declared).path).stem] if isinstance(declared, str) else []
+    for table in dict.fromkeys(tables + [name]):
+        file_path = schemas_dir / f'{table}.json'
+        if file_path.is_file():
+            return documents.load(file_path, result)
+    result.error(f"No table schema for resource '{name}' in {schemas_dir}")
+    return None
+
+
+def package_resources(
+    package_file: Path,
+    package_data: dict,
+    documents: Documents,
+    result: ValidationResult,
+    schemas_dir: Path = DEFAULT_SCHEMAS_DIR,
+) -> list[Resource] | None:
+    """
+    Return the local resource files of the datapackage.json *package_file*
+    with their table schemas and dialects, or None if it has none.
+    """
+    result.info(f"Checking data package: {package_file}")
+
+    resources = []
+    for resource in package_data.get('resources', []):
+        name = resource.get('name', '<unnamed>')
+        paths = resource.get('path', [])
+        if isinstance(paths, str):
+            paths = [paths]
+        schema = load_schema(resource, schemas_dir, documents, result)
+        for path in paths:
+            if urlparse(path).scheme:
+                result.warning(f"Skipping remote resource '{name}': {path}")
+                continue
+            dialect = scanner.resource_dialect(resource, path)
+            resources.append(Resource(name, package_file.parent / path, schema, dialect))
+
+    if not resources:
+        result.error(f"No local resource files in {package_file}")
+        return None
+    return resources
+
+
+def file_ranges(path: Path, jobs: int) -> list[tuple[int, int | None]]:
+    """
+    Return the (start, end) byte ranges to check the resource file *path*
+    in: up to *jobs* line-aligned ranges of at least
+    diagnose_tsv.PARALLEL_MIN_SIZE bytes if it is read as it is on disk, as
+    diagnose_tsv splits files, otherwise the whole file.
+    """
+    try:
+        size = path.stat().st_size if scanner.plain_file(path) else 0
+        parts = min(jobs, size // scanner.PARALLEL_MIN_SIZE)
+        return scanner.split_ranges(str(path), parts) if parts > 1 else [(0, None)]
+    except OSError:
+        # Let the check report the error
+        return [(0, None)]
+
+
+def _check_task(
+    task: tuple[str, dict | None, scanner.Dialect, list[tuple[str, ...]], str, int, int | None],
+    memory: int = KEY_MEMORY,
+) -> tuple[list[scanner.Check], int, bool] | str:
+    """
+    Worker entry point: check the byte range from *start* to *end* of a
+    resource file, logging its key values to *log_directory* (see KeyCheck).
+    Returns the checks, the number of newlines scanned and whether the range
+    ended inside a quoted field (see diagnose_tsv.scan_range), or why the
+    file cannot be read.
+    """
+    file_path, schema, dialect, joined, log_directory, start, end = task
+    checks = make_checks(schema, dialect, joined=joined, directory=log_directory, memory=memory)
+    key_checks = [check for check in checks if isinstance(check, KeyCheck)]
+    try:
+        lines, ends_open = scanner.scan_range(file_path, checks, dialect, start, end)
+        for check in key_checks:
+            check.finish()
+    except scanner.READ_ERRORS as exc:
+        return str(exc)
+    finally:
+        for check in key_checks:
+            check.close()
+    return checks, lines, ends_open
+
+
+def _search_task(task: tuple[KeyCheck, list[Path], LineShifts]) -> KeyCheck:
+    """Worker entry point: search the key logs of a file for repeated values (see KeyCheck.search)."""
+    check, directories, lines = task
+    check.search(directories, lines)
+    return check
+
+
+def merge_ranges(
+    plan: list[tuple],
+    results: list[tuple[list[scanner.Check], int, bool] | str],
+    check_task: Callable[[tuple], tuple[list[scanner.Check], int, bool] | str],
+) -> tuple[list[scanner.Check] | str, list[Path], LineShifts]:
+    """
+    Merge the *results* of the _check_task *plan* of a resource file, one
+    task per range, in file order, as diagnose_tsv.diagnose_files does. If
+    a range turns out to start inside a quoted field, the file is checked
+    again in one piece with *check_task*. Returns the checks, or why the
+    file cannot be read, with the log directories of the ranges and their
+    line shifts.
+    """
+    directories = [Path(task[4]) for task in plan]
+    errors = [outcome for outcome in results if isinstance(outcome, str)]
+    if not errors and any(ends_open for _, _, ends_open in results[:-1]):
+        # A range boundary fell inside a quoted field spanning lines
+        shutil.rmtree(directories[0].parent, ignore_errors=True)
+        plan = [plan[0][:5] + (0, None)]
+        directories = directories[:1]
+        results = [check_task(plan[0])]
+        errors = [outcome for outcome in results if isinstance(outcome, str)]
+    lines = LineShifts([task[5] for task in plan], [0] * len(plan))
+    if errors:
+        return errors[0], directories, lines
+
+    checks, line_shift, _ = results[0]
+    for r, (others, newlines, _) in enumerate(results[1:], 1):
+        for check, other in zip(checks, others):
+            check.merge(other, line_shift)
+        lines.shifts[r] = line_shift
+        line_shift += newlines
+    return checks, directories, lines
+
+
+def describe(item: dict) -> str:
+    """Return where a finding (see diagnose_tsv.finding) is, for a message."""
+    where = f"line {item['line']}" if item['line'] is not None else f"byte {item['offset']}"
+    if item.get('column') is not None:
+        where += f", column {item['column']}"
+    if item.get('field') is not None:
+        where += f" ({item['field']!r})"
+    if item.get('repeats') is not None:
+        where += f", repeating line {item['repeats']}"
+    return where
+
+
+def report_outcome(resource: Resource, outcome: list[scanner.Check] | str, result: ValidationResult) -> bool:
+    """Record the problems found in a resource file; return whether it has no errors."""
+    if isinstance(outcome, str):
+        result.error(f"Could not read resource '{resource.name}' ({resource.path}): {outcome}")
+        return False
+
+    valid = True
+    for check in outcome:
+        findings = check.findings()
+        for rule, count in check.counts().items():
+            examples = "; ".join(describe(item) for item in findings if item['rule'] == rule)
+            msg = f"{resource.path.name}: {count} {rule} problem(s)" + (f" (e.g., {examples})" if examples else "")
+            if rule in WARNING_RULES:
+                result.warning(msg)
+            else:
+                result.error(msg)
+                valid = False
+    return valid
+
+
+def check_data(
+    resources: list[Resource],
+    result: ValidationResult,
+    executor: Executor | None = None,
+    memory: int = KEY_MEMORY,
+    spill_dir: str | None = None,
+    jobs: int = 1,
+) -> 'KeyLogs | None':
+    """
+    Check every resource file against its table schema, concurrently in
+    *executor* if given, and report them in resource order. Files of at
+    least diagnose_tsv.PARALLEL_MIN_SIZE bytes are checked in up to *jobs*
+    ranges at a time, merged once all are done (see merge_ranges); the
+    unique keys of a file are then searched for repeated values across the
+    key logs of its ranges, a file per task. The key values of each range
+    are kept within *memory* bytes, spilling to *spill_dir*. Returns the
+    values logged for the foreign keys between the tables, if any.
+    """
+    key_logs = KeyLogs(resources, declared_foreign_keys(resources), spill_dir)
+    try:
+        plans = [
+            [(str(resource.path), resource.schema, resource.dialect, key_logs.joined.get(resource.name, []),
+              str(key_logs.root / str(n) / str(r)), start, end)
+             for r, (start, end) in enumerate(file_ranges(resource.path, jobs))]
+            for n, resource in enumerate(resources)
+        ]
+        check_task = functools.partial(_check_task, memory=memory)
+        tasks = [task for plan in plans for task in plan]
+        scans = executor.map(check_task, tasks) if executor is not None else map(check_task, tasks)
+        outcomes = [merge_ranges(plan, [next(scans) for _ in plan], check_task) for plan in plans]
+
+        searches = [
+            (n, k, (check, directories, lines))
+            for n, (checks, directories, lines) in enumerate(outcomes) if not isinstance(checks, str)
+            for k, check in enumerate(checks) if isinstance(check, KeyCheck)
+        ]
+        tasks = [task for _, _, task in searches]
+        searched = executor.map(_search_task, tasks) if executor is not None else map(_search_task, tasks)
+        for (n, k, _), check in zip(searches, searched):
+            outcomes[n][0][k] = check
+
+        valid_count = 0
+        for resource, (outcome, directories, lines) in zip(resources, outcomes):
+            valid_count += report_outcome(resource, outcome, result)
+            if resource.name in key_logs.joined:
+                columns = None
+                if not isinstance(outcome, str):
+                    columns = next(check.columns for check in outcome if isinstance(check, KeyCheck))
+                key_logs.files.setdefault(resource.name, []).append((resource.path.name, directories, columns, lines))
+    except BaseException:
+        key_logs.close()
+        raise
+
+    result.info(f"  Data: {valid_count}/{len(resources)} resource files valid")
+    if not key_logs.foreign_keys:
+        key_logs.close()
+        return None
+    return key_logs
+
+
+# ---------------------------------------------------------------------------
+# Foreign keys
+# ---------------------------------------------------------------------------
+
+class ForeignKey(NamedTuple):
+    """A foreignKeys or weakForeignKeys declaration of a table."""
+    table: str
+    fields: tuple[str, ...]
+    target: str
+    target_fields: tuple[str, ...]
+    weak: bool
+
+
+def as_fields(value) -> tuple[str, ...]:
+    """Return the field name or names of a foreign key declaration as a tuple."""
+    if isinstance(value, list):
+        return tuple(value)
+    return (value,) if value else ()
+
+
+def declared_foreign_keys(resources: list[Resource]) -> list[ForeignKey]:
+    """Return the foreign keys of the tables of *resources*, in resource order, weak ones last."""
+    schemas = {}
+    for resource in resources:
+        if resource.schema is not None:
+            schemas.setdefault(resource.name, resource.schema)
+
+    foreign_keys = []
+    for name, schema in schemas.items():
+        for weak, declared in ((False, schema.get('foreignKeys')), (True, schema.get('weakForeignKeys'))):
+            for declaration in declared or []:
+                reference = declaration.get('reference') or {}
+                target = (reference.get('resource') or '').strip() or name
+                fields, target_fields = as_fields(declaration.get('fields')), as_fields(reference.get('fields'))
+                if fields and len(fields) == len(target_fields):
+                    # Otherwise reported by the table schema checks
+                    foreign_keys.append(ForeignKey(name, fields, target, target_fields, weak))
+    return foreign_keys
+
+
+class KeyLogs:
+    """
+    The key values of a package logged by its data checks, in a temporary
+    directory under *spill_dir*. For each table: its unique keys, searched
+    for repeated values file by file, and the keys joined by *foreign_keys*,
+    the keys they reference and their own, whose logs are kept for
+    check_references; and for each of its files, the log directories of its
+    ranges, the column of each key (see KeyCheck), or None if the file could
+    not be read, and the line shifts of the ranges.
+    """
+
+    def __init__(self, resources: list[Resource], foreign_keys: list[ForeignKey], spill_dir: str | None = None):
+        self.foreign_keys = foreign_keys
+        self.unique: dict[str, list[tuple[str, ...]]] = {}
+        for resource in resources:
+            self.unique.setdefault(resource.name, table_keys(resource.schema) if resource.schema is not None else [])
+        self.joined: dict[str, list[tuple[str, ...]]] = {}
+        for fk in foreign_keys:
+            self.joined.setdefault(fk.target, []).append(fk.target_fields)
+            self.joined.setdefault(fk.table, []).append(fk.fields)
+        self.joined = {table: list(dict.fromkeys(keys)) for table, keys in self.joined.items()}
+        self._temporary = tempfile.TemporaryDirectory(prefix='dwc-dp-keys-', dir=spill_dir)
+        self.root = Path(self._temporary.name)
+        self.files: dict[str, list[tuple[str, list[Path], list[int | None] | None, LineShifts]]] = {}
+
+    def keys(self, table: str) -> list[tuple[str, ...]]:
+        """The keys logged for *table*, numbered as the subdirectories of its log directories."""
+        return list(dict.fromkeys(self.unique.get(table, []) + self.joined.get(table, [])))
+
+    def close(self) -> None:
+        """Remove the logs."""
+        self._temporary.cleanup()
+
+
+def _join_task(
+    task: tuple[list[Path], list[tuple[int, str, list[Path], int, LineShifts]], Path],
+    memory: int = KEY_MEMORY,
+) -> dict[int, dict[str, list]]:
+    """
+    Worker entry point: look up the values logged for foreign keys in those
+    logged for the key they reference, a partition at a time, and return
+    the values not found: foreign key number -> file name -> [count, (line,
+    offset, column) of the first ones].
+    """
+    key_directories, streams, scratch = task
+    missing: dict[int, dict[str, list]] = {}
+    size = RECORD.size
+    for n in range(PARTITIONS):
+        name = f'{n:02x}'
+        partition = [[directory / name for directory in key_directories]]
+        partition += [[directory / name for directory in directories] for _, _, directories, _, _ in streams]
+        for key_paths, *stream_paths in fitting_partitions(partition, memory, scratch, 1):
+            digests = set()
+            for path in key_paths:
+                for data in read_records(path, memory):
+                    digests.update(data[i:i + DIGEST_SIZE] for i in range(0, len(data), size))
+            for (number, file_name, _, column, lines), paths in zip(streams, stream_paths):
+                for path in paths:
+                    for data in read_records(path, memory):
+                        found = map(digests.__contains__, [data[i:i + DIGEST_SIZE] for i in range(0, len(data), size)])
+                        for i in compress(count(), map(not_, found)):
+                            _, offset, line = RECORD.unpack_from(data, i * size)
+                            entry = missing.setdefault(number, {}).setdefault(file_name, [0, []])
+                            entry[0] += 1
+                            entry[1].append((lines.line(line, offset), offset, column))
+                            if len(entry[1]) > 4 * EXAMPLES:
+                                entry[1] = heapq.nsmallest(EXAMPLES, entry[1])
+    return missing
+
+
+def check_references(
+    key_logs: KeyLogs,
+    result: ValidationResult,
+    executor: Executor | None = None,
+    memory: int = KEY_MEMORY,
+) -> None:
+    """
+    Check that the values of the foreignKeys of every table are values of the
+    keys they reference, and warn about those of its weakForeignKeys that are
+    not, from the key values logged by check_data. The foreign keys
+    referencing a key are joined with it in one task, concurrently in
+    *executor* if given; each task loads a partition of the key's digests
+    at a time within *memory* bytes. The logs of a key are removed as soon
+    as the last task using them is done.
+    """
+    try:
+        joins: dict[tuple[str, tuple[str, ...]], list[int]] = {}
+        for number, fk in enumerate(key_logs.foreign_keys):
+            joins.setdefault((fk.target, fk.target_fields), []).append(number)
+
+        tasks = []
+        for (target, target_fields), numbers in joins.items():
+            key_directories = []
+            if target in key_logs.files:
+                k = key_logs.keys(target).index(target_fields)
+                files = key_logs.files[target]
+                if any(columns is None or columns[k] is None for _, _, columns, _ in files):
+                    # Unreadable, or without the key fields: reported by the data checks
+                    continue
+                key_directories = [directory / str(k) for _, directories, _, _ in files for directory in directories]
+            streams = []
+            for number in numbers:
+                fk = key_logs.foreign_keys[number]
+                k = key_logs.keys(fk.table).index(fk.fields)
+                streams += [
+                    (number, file_name, [directory / str(k) for directory in directories], columns[k], lines)
+                    for file_name, directories, columns, lines in key_logs.files.get(fk.table, [])
+                    if columns is not None and columns[k] is not None
+                ]
+            if streams:
+                tasks.append((key_directories, streams, key_logs.root))
+
+        users = Counter(path for task in tasks for path in task_directories(task))
+        join = functools.partial(_join_task, memory=memory)
+        if executor is not None:
+            futures = {executor.submit(join, task): task for task in tasks}
+            outcomes = ((futures[future], future.result()) for future in as_completed(futures))
+        else:
+            outcomes = ((task, join(task)) for task in tasks)
+        missing: dict[int, dict[str, list]] = {}
+        checked: set[int] = set()
+        for task, found in outcomes:
+            missing.update(found)
+            checked.update(number for number, *_ in task[1])
+            for path in task_directories(task):
+                users[path] -= 1
+                if not users[path]:
+                    shutil.rmtree(path, ignore_errors=True)
+    finally:
+        key_logs.close()
+
+    for number, fk in enumerate(key_logs.foreign_keys):
+        fields = ', '.join(fk.fields)
+        target = f"{fk.target}.{', '.join(fk.target_fields)}"
+        for file_name, (n, found) in missing.get(number, {}).items():
+            examples = "; ".join(
+                describe(scanner.finding('foreign-key', line, offset, column))
+                for line, offset, column in heapq.nsmallest(EXAMPLES, found)
+            )
+            if fk.target in key_logs.files:
+                msg = f"{file_name}: {n} value(s) of '{fields}' not found in {target} (e.g., {examples})"
+            else:
+                msg = (f"{file_name}: {n} value(s) of '{fields}' reference '{fk.target}', "
+                       f"which is not in the data package (e.g., {examples})")
+            if fk.weak:
+                result.warning(msg)
+            else:
+                result.error(msg)
+
+    satisfied = len(checked - missing.keys())
+    result.info(f"  References: {satisfied}/{len(checked)} foreign keys satisfied")
+
+
+def task_directories(task: tuple[list[Path], list[tuple[int, str, list[Path], int, LineShifts]], Path]) -> list[Path]:
+    """The log directories a join task reads."""
+    key_directories, streams, _ = task
+    return key_directories + [directory for _, _, directories, _, _ in streams for directory in directories]
+
+
+def data_passes(
+    schemas_dir: Path = DEFAULT_SCHEMAS_DIR,
+    executor: Executor | None = None,
+    memory: int = KEY_MEMORY,
+    spill_dir: str | None = None,
+    jobs: int = 1,
+) -> list[Pass]:
+    """
+    The passes of the data validation of a datapackage.json: resolve its
+    resources, then check their files, in *executor* if given, large ones in
+    up to *jobs* ranges, with *memory* bytes for the key values of each file
+    or range (see KeyLog), and join the key values they log to check the
+    foreign keys between them.
+    """
+    return [
+        Pass('package', load_package, ('package_file', 'documents'), 'package_data'),
+        Pass('resources', functools.partial(package_resources, schemas_dir=schemas_dir),
+             ('package_file', 'package_data', 'documents'), 'resources'),
+        Pass('data', functools.partial(check_data, executor=executor, memory=memory, spill_dir=spill_dir, jobs=jobs),
+             ('resources',), 'key_logs'),
+        Pass('references', functools.partial(check_references, executor=executor, memory=memory),
+             ('key_logs',)),
+    ]
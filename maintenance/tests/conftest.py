@@ -0,0 +1,11 @@
+# Tests of the maintenance scripts, run with: python -m pytest maintenance/tests
+#
+# The maintenance scripts are not a package: make their modules importable as the
+# scripts themselves import them
+import sys
+from pathlib import Path
+
+MAINTENANCE_DIR = Path(__file__).resolve().parents[1]
+for path in (MAINTENANCE_DIR, MAINTENANCE_DIR / "tools"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
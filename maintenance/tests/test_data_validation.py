@@ -0,0 +1,37 @@
+import data_validation as dv
+from validation_engine import ValidationResult
+
+EVENT_SCHEMA = {
+    "fields": [{"name": "event_pk"}, {"name": "parentEvent_fk"}],
+    "primaryKey": "event_pk",
+    "foreignKeys": [{"fields": "parentEvent_fk", "reference": {"resource": "", "fields": "event_pk"}}],
+}
+
+
+def check_package(resources, jobs):
+    result = ValidationResult(echo=False)
+    key_logs = dv.check_data(resources, result, jobs=jobs)
+    if key_logs is not None:
+        dv.check_references(key_logs, result)
+    return result.messages
+
+
+def test_ranges_of_a_file_report_as_the_whole_file(tmp_path, monkeypatch):
+    # Repeated keys and missing references in later ranges, repeating and
+    # referencing lines of earlier ones
+    rows = [f"e{i}\t{'e0' if i % 100 else ''}" for i in range(1000)]
+    rows[700] = "e150\te0"
+    rows[900] = "e9001\tmissing"
+    rows[950] = "e20\tmissing"
+    path = tmp_path / "event.tsv"
+    path.write_text("event_pk\tparentEvent_fk\n" + "\n".join(rows) + "\n", encoding="utf-8")
+    resources = [dv.Resource("event", path, EVENT_SCHEMA, dv.scanner.resource_dialect({}, str(path)))]
+
+    whole = check_package(resources, jobs=1)
+    monkeypatch.setattr(dv.scanner, "PARALLEL_MIN_SIZE", 1024)
+    assert len(dv.file_ranges(path, 4)) == 4
+    assert check_package(resources, jobs=4) == whole
+    assert ("error", "event.tsv: 2 schema-unique problem(s) (e.g., line 702, column 1 ('event_pk'), "
+                     "repeating line 152; line 952, column 1 ('event_pk'), repeating line 22)") in whole
+    assert ("error", "event.tsv: 2 value(s) of 'parentEvent_fk' not found in event.event_pk "
+                     "(e.g., line 902, column 2; line 952, column 2)") in whole
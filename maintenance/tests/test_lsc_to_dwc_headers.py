@@ -0,0 +1,44 @@
+import json
+
+import lsc_to_dwc_headers as lsc
+
+
+def write_schema(directory, table_name, fields):
+    directory.mkdir(parents=True, exist_ok=True)
+    schema = {"fields": [{"name": name} for name in fields], "primaryKey": fields[0]}
+    (directory / f"{table_name}.json").write_text(json.dumps(schema), encoding="utf-8")
+    return schema
+
+
+def cache_schema(cache_dir, table_name, fields):
+    schema = {"fields": [{"name": name} for name in fields], "primaryKey": fields[0]}
+    url = f"{lsc.SCHEMA_BASE_URL}/{table_name}.json"
+    lsc.write_cache(cache_dir, url, json.dumps(schema).encode("utf-8"), {})
+
+
+def resolver_and_index(tmp_path):
+    schemas = tmp_path / "table-schemas"
+    write_schema(schemas, "event", ["eventID", "eventDate", "locality"])
+    cache_dir = tmp_path / "cache"
+    cache_schema(cache_dir, "survey", ["eventID", "eventDate", "surveyNotes"])
+    resolver = lsc.SchemaResolver(schemas, cache_dir, offline=True)
+    return resolver, lsc.load_header_index(resolver, cache_dir)
+
+
+def test_file_named_after_a_table_only_in_the_cache_is_not_detected_by_header(tmp_path):
+    resolver, index = resolver_and_index(tmp_path)
+    table, spec, how = lsc.find_table("survey", ["event_id", "event_date"], index, resolver)
+    assert (table, how) == ("survey", "schema")
+    assert spec["mapping"]["surveynotes"] == "surveyNotes"
+
+
+def test_file_named_after_no_table_is_detected_by_header(tmp_path):
+    resolver, index = resolver_and_index(tmp_path)
+    table, _, how = lsc.find_table("my_events", ["event_id", "event_date", "locality"], index, resolver)
+    assert (table, how) == ("event", "header")
+
+
+def test_file_named_after_a_local_table_is_found_by_name(tmp_path):
+    resolver, index = resolver_and_index(tmp_path)
+    table, _, how = lsc.find_table("Event", ["survey_notes"], index, resolver)
+    assert (table, how) == ("event", "name")
@@ -0,0 +1,56 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import validation_engine as engine
+
+
+class CountingChecker(engine.UrlChecker):
+    # Answers every URL with 200 after a pause, instead of requesting it, counting
+    # the requests and the most in flight at once
+
+    def __init__(self, concurrency):
+        super().__init__(concurrency, host_concurrency=100)
+        self.counting = threading.Lock()
+        self.requested: list[str] = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def head(self, url):
+        with self.counting:
+            self.requested.append(url)
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.counting:
+            self.in_flight -= 1
+        return 200
+
+
+def test_concurrent_checks_request_each_url_once_within_the_concurrency():
+    checker = CountingChecker(concurrency=4)
+    urls = [f"https://example.org/{i}" for i in range(40)]
+    try:
+        with ThreadPoolExecutor(max_workers=4) as callers:
+            outcomes = list(callers.map(checker.check, [urls] * 4))
+    finally:
+        checker.close()
+
+    assert all(outcome == dict.fromkeys(urls) for outcome in outcomes)
+    assert sorted(checker.requested) == sorted(urls)
+    assert checker.most_in_flight <= 4
+
+
+def test_mapped_urls_are_not_requested(tmp_path):
+    (tmp_path / "event.json").write_text("{}", encoding="utf-8")
+    checker = CountingChecker(concurrency=4)
+    checker.url_map = [("https://example.org/schemas/", tmp_path)]
+    try:
+        outcomes = checker.check(["https://example.org/schemas/event.json",
+                                  "https://example.org/schemas/missing.json"])
+    finally:
+        checker.close()
+
+    assert outcomes["https://example.org/schemas/event.json"] is None
+    assert "No local file" in outcomes["https://example.org/schemas/missing.json"]
+    assert checker.requested == []
@@ -1,70 +1,1902 @@
 #!/usr/bin/env python3
-# Diagnostic script to check a TSV file for issues that might break Frictionless validation.
+# Diagnostic script to check a TSV or CSV file for issues that might break Frictionless validation.
+#
+# The file is read exactly once, in fixed-size binary chunks, and every diagnostic is
+# computed in that single pass. The scanner hands each check a Block of complete records
+# (raw bytes, never decoded line by line). To add a diagnostic, subclass Check and add
+# it to make_checks().
+#
+# Quoted fields may contain delimiters and newlines. A block never ends inside a quoted
+# field: the record it leaves open is carried over to the next block. Only records that
+# contain a quote character are looked at more closely than a bytes.split (see Dialect).
+#
+# Given a data package directory instead of a file, every resource listed in its
+# datapackage.json is diagnosed, in a pool of worker processes, followed by a summary.
+# Files larger than PARALLEL_MIN_SIZE are split into byte ranges on line boundaries
+# that are scanned concurrently; each check merges the per-range results and global
+# line numbers are restored from the line count of the preceding ranges.
+#
+# Regular files are memory-mapped rather than read. The carriage return and control
+# character check only counts the characters of a block with bytes methods, and
+# searches the map for their locations when a block has any.
+#
+# Compressed files (.gz, .bz2, .xz) and members of zip archives, named as
+# package.zip/event.tsv, are streamed and decompressed on the fly rather than extracted.
+# A zip archive holding a datapackage.json is diagnosed like a package directory.
+#
+# With --fix, the same pass also writes a repaired copy of the file (no BOM, LF line
+# endings, no control characters) that atomically replaces the original.
+#
+# With --format json or ndjson, every finding is reported with its rule ID, line number,
+# byte offset and column index, up to --max-findings per rule, for tools that seek to
+# the problem rows. The exit status is 0 if nothing was found, 1 if something was,
+# 2 for bad arguments and 3 if an input could not be read.
+#
+# Usage: python diagnose_tsv.py [--schema] [--jobs N] [--delimiter D] [--format F] path/to/file.tsv|path/to/package[.zip]
 
 import sys
 import os
 import re
+import mmap
+import codecs
+import json
+import math
+import random
+import argparse
+import gzip
+import bz2
+import lzma
+import zipfile
+import shutil
+import tempfile
+import threading
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+from itertools import accumulate, groupby
+from operator import itemgetter, methodcaller
 
-def check_bom(file_path):
-    with open(file_path, 'rb') as f:
-        first_bytes = f.read(3)
-        if first_bytes == b'\xef\xbb\xbf':
+# Size of each binary read. Blocks handed to the checks are cut back to the last
+# newline, so a block may be slightly smaller (or larger, for very long lines).
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Files at least this large are scanned in parallel byte ranges of at least this size
+PARALLEL_MIN_SIZE = 64 * 1024 * 1024
+
+UTF8_BOM = b'\xef\xbb\xbf'
+CONTROL_BYTES = bytes([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F])
+CONTROL_CHARS = re.compile(b'[' + re.escape(CONTROL_BYTES) + b']')
+CARRIAGE_RETURN = re.compile(rb'\r')
+INVISIBLE_CHARS = re.compile(rb'[\r\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
+
+# Bytes of context shown either side of a character reported by position
+CONTEXT_BYTES = 20
+
+# Number of line numbers shown for each kind of problem
+REPORT_LIMIT = 5
+
+# Findings recorded per rule and file in the machine-readable report
+DEFAULT_MAX_FINDINGS = 1000
+
+# Longest record that a quoted field may span, the default csv.field_size_limit();
+# a quote that is still open after this many bytes is reported as unterminated
+# and taken literally
+MAX_RECORD_SIZE = 128 * 1024
+
+# Locations kept per column count: the first SAMPLE_FIRST lines, plus a uniform
+# random sample of SAMPLE_RESERVOIR lines from the rest for offending counts
+SAMPLE_FIRST = 3
+SAMPLE_RESERVOIR = 3
+
+PACKAGE_DESCRIPTOR = 'datapackage.json'
+
+# Compressed files are decompressed as they are read, never written out
+DECOMPRESSORS = {
+    '.gz': lambda f: gzip.GzipFile(fileobj=f),
+    '.bz2': bz2.BZ2File,
+    '.xz': lzma.LZMAFile,
+}
+
+# Errors raised when an input cannot be read, besides OSError
+READ_ERRORS = (OSError, EOFError, zipfile.BadZipFile, lzma.LZMAError)
+
+# Exit status: nothing found, something found, bad arguments (as argparse), unreadable input
+EXIT_OK = 0
+EXIT_FINDINGS = 1
+EXIT_USAGE = 2
+EXIT_READ_ERROR = 3
+
+# Default location of the DwC-DP table schemas used by --schema
+DEFAULT_SCHEMAS_DIR = Path(__file__).resolve().parents[2] / 'dwc-dp' / 'table-schemas'
+
+# Numeric field types: (cell pattern, bytes a valid cell is made of, converter).
+# A column whose cells contain only those bytes and all convert is valid; the
+# pattern is only used cell by cell to locate offenders once a column fails.
+NUMERIC_TYPES = {
+    'integer': (re.compile(rb'[+-]?\d+'), b'0123456789+-', int),
+    'number': (
+        re.compile(rb'[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?|NaN|[+-]?INF'),
+        b'0123456789+-.eE',
+        float,
+    ),
+}
+
+# Frictionless defaults for boolean fields without trueValues/falseValues
+DEFAULT_TRUE_VALUES = ['true', 'True', 'TRUE', '1']
+DEFAULT_FALSE_VALUES = ['false', 'False', 'FALSE', '0']
+
+# ---------------------------------------------------------------------------
+# Dialects
+# ---------------------------------------------------------------------------
+
+class Dialect:
+    """
+    Delimiter, quote and escape characters of a delimited text file.
+
+    Quoting is honoured without a per-row csv.reader. Blocks that contain no
+    quote or escape character, the common case, are still split and counted
+    with bytes.split and bytes.count. A block that does has the quoted fields
+    that close on the line they open on removed by a single regular
+    expression substitution before its delimiters are counted. Only the lines
+    on which a quoted field opens but does not close are read one record at
+    a time. As in Python's csv module, a quote only opens a quoted field at
+    the start of a field and is taken literally anywhere else.
+    """
+
+    # States of a record returned by read_record()
+    CLOSED, OPEN, UNTERMINATED = 'closed', 'open', 'unterminated'
+
+    def __init__(self, delimiter: str = '\t', quotechar: str | None = '"', escapechar: str | None = None):
+        self.delimiter = self._byte('delimiter', delimiter)
+        self.quotechar = self._byte('quote character', quotechar) if quotechar else None
+        # Escapes are only recognised along with quoting
+        self.escapechar = self._byte('escape character', escapechar) if escapechar and quotechar else None
+        if self.quotechar is None:
+            return
+
+        d, q = re.escape(self.delimiter), re.escape(self.quotechar)
+        # Quoted field contents (in a record, and within a line) and plain fields,
+        # written so that they never backtrack
+        if self.escapechar is None:
+            inner, inner_line = rb'[^%s]*(?:%s%s[^%s]*)*' % (q, q, q, q), rb'[^%s\n]*(?:%s%s[^%s\n]*)*' % (q, q, q, q)
+            plain = rb'[^%s]*' % d
+        else:
+            e = re.escape(self.escapechar)
+            inner = rb'[^%s%s]*(?:(?:%s%s|%s.)[^%s%s]*)*' % (q, e, q, q, e, q, e)
+            inner_line = rb'[^%s%s\n]*(?:(?:%s%s|%s[^\n])[^%s%s\n]*)*' % (q, e, q, q, e, q, e)
+            plain = rb'[^%s%s]*(?:%s.[^%s%s]*)*' % (d, e, e, d, e)
+            self._unescape = re.compile(e + rb'(.)', re.S)
+            self._unescape_line = re.compile(e + rb'[^\n]')
+        # A quote that starts a field: first in the data or after a delimiter or newline.
+        # Starting with the quote itself lets the search skip straight to each quote.
+        opening = rb'%s(?<![^%s\n]%s)' % (q, d, q)
+        # The rest of a line that starts inside a quoted field, up to the quote that closes it
+        self._inside = re.compile(inner, re.S)
+        # Closed quoted fields, and the opening quote of one that is still open
+        self._quoted = re.compile(opening + inner + rb'%s(?!%s)' % (q, q), re.S)
+        self._quoted_line = re.compile(opening + inner_line + rb'%s(?!%s)' % (q, q))
+        self._opening = re.compile(opening)
+        # One field of a record with a delimiter appended:
+        # (quoted value, text after its closing quote, open field, plain value)
+        self._field = re.compile(
+            rb'%s(%s)%s(?!%s)([^%s]*)%s|(%s.*)\Z|(%s)%s' % (q, inner, q, q, d, d, q, plain, d), re.S)
+
+    @staticmethod
+    def _byte(name: str, char: str) -> bytes:
+        encoded = char.encode('utf-8')
+        if len(encoded) != 1:
+            raise ValueError(f"The {name} must be a single-byte character, not {char!r}")
+        return encoded
+
+    @classmethod
+    def for_file(cls, file_path, delimiter: str | None = None, quotechar: str | None = '"',
+                 escapechar: str | None = None) -> 'Dialect':
+        """The dialect of *file_path*: comma-separated for .csv files and tab-separated otherwise, unless *delimiter* is given."""
+        if delimiter is None:
+            path = Path(file_path)
+            if path.suffix.lower() in DECOMPRESSORS:
+                path = path.with_suffix('')
+            delimiter = ',' if path.suffix.lower() == '.csv' else '\t'
+        return cls(delimiter, quotechar, escapechar)
+
+    def plain(self, data: bytes) -> bool:
+        """True if *data* holds no quote or escape character, so that it splits on every delimiter."""
+        q, e = self.quotechar, self.escapechar
+        return q is None or (q not in data and (e is None or e not in data))
+
+    def strip(self, data: bytes) -> bytes:
+        """Return *data* without its closed quoted fields and escaped characters."""
+        stripped = self._quoted.sub(b'', data)
+        if self.escapechar is not None and self.escapechar in stripped:
+            stripped = self._unescape.sub(b'', stripped)
+        return stripped
+
+    def count_lines(self, data: bytes, lines: int) -> tuple[list[int], list[int]]:
+        """
+        Count the delimiters on each of the first *lines* lines of *data* as
+        if every line were a record. Return the counts and the indices of the
+        lines on which a quoted field opens without closing: those lines start
+        records that must be read with read_record().
+        """
+        stripped = self._quoted_line.sub(b'', data)
+        if self.escapechar is not None and self.escapechar in stripped:
+            stripped = self._unescape_line.sub(b'', stripped)
+        counts = list(map(methodcaller('count', self.delimiter), stripped.split(b'\n', lines)[:lines]))
+
+        opened = []
+        line = pos = 0
+        for match in self._opening.finditer(stripped):
+            line += stripped.count(b'\n', pos, match.start())
+            pos = match.start()
+            if not opened or opened[-1] != line:
+                opened.append(line)
+        return counts, opened
+
+    def count(self, record: bytes) -> tuple[int, bool]:
+        """
+        Return the number of delimiters separating the fields of *record* and
+        whether its last field is a quoted field that is still open.
+        """
+        if self.plain(record):
+            return record.count(self.delimiter), False
+        stripped = self.strip(record)
+        opening = self._opening.search(stripped)
+        if opening is None:
+            return stripped.count(self.delimiter), False
+        return stripped.count(self.delimiter, 0, opening.start()), True
+
+    def read_record(self, lines: list[bytes], j: int) -> tuple[bytes, int, int, str]:
+        """
+        Read the record that starts on *lines[j]* and return (record, number
+        of delimiters, index of the line that follows it, state). The state is
+        CLOSED, or OPEN when the lines run out inside a quoted field. A quoted
+        field that would make the record longer than MAX_RECORD_SIZE is taken to
+        be a stray quote: the record is then *lines[j]* alone, quote included,
+        and the state UNTERMINATED.
+        """
+        record = lines[j]
+        delimiters, is_open = self.count(record)
+        k, size = j + 1, len(record)
+        while is_open:
+            if k == len(lines):
+                return b'\n'.join(lines[j:k]), delimiters, k, self.OPEN
+            line = lines[k]
+            k += 1
+            size += len(line) + 1
+            if size > MAX_RECORD_SIZE:
+                return lines[j], self.strip(lines[j]).count(self.delimiter), j + 1, self.UNTERMINATED
+            if not self.plain(line) and self._inside.match(line).end() < len(line):
+                # The open field closes on this line
+                record = b'\n'.join(lines[j:k])
+                delimiters, is_open = self.count(record)
+        return record, delimiters, k, self.CLOSED
+
+    def split(self, record: bytes) -> list[bytes]:
+        """Return the cell values of *record*, unquoted."""
+        if self.plain(record):
+            return record.split(self.delimiter)
+        q = self.quotechar
+        qq = q + q
+        fields = self._field.findall(record + self.delimiter)
+        cells = [
+            (quoted.replace(qq, q) if qq in quoted else quoted) + after + plain
+            for quoted, after, _, plain in fields
+        ]
+        if fields[-1][2]:
+            # A field left open runs to the end of the record
+            cells[-1] = fields[-1][2][:-1]
+        if self.escapechar is not None and self.escapechar in record:
+            cells = [self._unescape.sub(rb'\1', cell) for cell in cells]
+        return cells
+
+
+TSV = Dialect()
+
+
+# ---------------------------------------------------------------------------
+# Blocks
+# ---------------------------------------------------------------------------
+
+class Block:
+    """
+    A run of complete records of the file: bytes *start* to *end* of
+    *buffer*, which is either a chunk that was read or the memory map of the
+    whole file. Checks that only search bytes can do so in *buffer* directly;
+    the copied bytes, split lines, records, their delimiter counts and byte
+    offsets are derived on first use and shared by all checks.
+
+    A record is a line, unless a quoted field spans several lines. Records
+    are only rebuilt from lines when that happens, or when a quoted field is
+    never closed; otherwise the records are the lines themselves.
+    """
+
+    def __init__(self, buffer: bytes | mmap.mmap, offset: int, first_line: int,
+                 start: int = 0, end: int | None = None, dialect: Dialect = TSV):
+        self.buffer = buffer
+        self.start = start
+        self.end = len(buffer) if end is None else end
+        self.offset = offset
+        self.first_line = first_line
+        self.dialect = dialect
+        self._data: bytes | None = None
+        self._lines: list[bytes] | None = None
+        self._records: list[bytes] | None = None
+        # Line index of each record, or None when every record is one line
+        self._record_lines: list[int] | None = None
+        self._delimiter_counts: list[int] | None = None
+        self._unterminated: list[int] = []
+        self._open: int | None = None
+        self._starts: list[int] | None = None
+
+    @property
+    def data(self) -> bytes:
+        """The bytes of the block."""
+        if self._data is None:
+            whole = isinstance(self.buffer, bytes) and self.start == 0 and self.end == len(self.buffer)
+            self._data = self.buffer if whole else self.buffer[self.start:self.end]
+        return self._data
+
+    @property
+    def lines(self) -> list[bytes]:
+        """The lines of the block, without line terminators."""
+        if self._lines is None:
+            lines = self.data.split(b'\n')
+            if lines[-1] == b'':
+                # Blocks end with a newline except, possibly, the last one
+                lines.pop()
+            self._lines = lines
+        return self._lines
+
+    @property
+    def records(self) -> list[bytes]:
+        """The records of the block, without their final line terminator."""
+        if self._records is None:
+            self._parse()
+        return self._records
+
+    @property
+    def delimiter_counts(self) -> list[int]:
+        """The number of delimiters separating the fields of each record."""
+        if self._records is None:
+            self._parse()
+        return self._delimiter_counts
+
+    @property
+    def unterminated(self) -> list[int]:
+        """Indices of the records holding a quoted field that is never closed."""
+        if self._records is None:
+            self._parse()
+        return self._unterminated
+
+    @property
+    def ends_open(self) -> bool:
+        """True if the block ends inside a quoted field."""
+        if self._records is None:
+            self._parse()
+        return self._open is not None
+
+    def _parse(self) -> None:
+        lines, dialect = self.lines, self.dialect
+        self._records = lines
+        if dialect.plain(self.data):
+            self._delimiter_counts = list(map(methodcaller('count', dialect.delimiter), lines))
+            return
+        counts, opened = dialect.count_lines(self.data, len(lines))
+        self._delimiter_counts = counts
+
+        # Read the records in which a quoted field spans lines or is never closed
+        spans = []
+        i = 0
+        for j in opened:
+            if j < i:
+                # Inside a record that spans several lines
+                continue
+            record, counts[j], i, state = dialect.read_record(lines, j)
+            if i > j + 1 or state != Dialect.CLOSED:
+                spans.append((j, i, record, state))
+        if not spans:
+            return
+
+        records, record_lines, delimiter_counts = [], [], []
+        i = 0
+        for j, k, record, state in spans:
+            records += lines[i:j]
+            record_lines += range(i, j)
+            delimiter_counts += counts[i:j]
+            if state != Dialect.CLOSED:
+                self._unterminated.append(len(records))
+                if state == Dialect.OPEN:
+                    self._open = len(records)
+            records.append(record)
+            record_lines.append(j)
+            delimiter_counts.append(counts[j])
+            i = k
+        records += lines[i:]
+        record_lines += range(i, len(lines))
+        delimiter_counts += counts[i:]
+        self._records, self._record_lines, self._delimiter_counts = records, record_lines, delimiter_counts
+
+    def cells(self, i: int) -> list[bytes]:
+        """The cell values of the i-th record, without a final carriage return."""
+        return self.dialect.split(self.records[i].removesuffix(b'\r'))
+
+    def rows(self, index: range | list[int], maxsplit: int) -> list[list[bytes]]:
+        """
+        The cells of the records at *index*, without a final carriage return.
+        Records without quotes are split no further than *maxsplit* delimiters.
+        """
+        records = self.records
+        if isinstance(index, range):
+            selected = records[index.start:index.stop]
+        else:
+            selected = [records[i] for i in index]
+        if b'\r' in self.data:
+            selected = [record.removesuffix(b'\r') for record in selected]
+        split = methodcaller('split', self.dialect.delimiter, maxsplit)
+        plain = self.dialect.plain
+        if plain(self.data):
+            return list(map(split, selected))
+        split_quoted = self.dialect.split
+        return [split(record) if plain(record) else split_quoted(record) for record in selected]
+
+    def row_index(self, width: int) -> range | list[int]:
+        """
+        The indices of the data records of the block that have *width* cells:
+        not the header, nor records with an unterminated quote, which are left
+        to ColumnCountCheck and QuoteCheck.
+        """
+        skip = 1 if self.offset == 0 else 0
+        delimiters = width - 1
+        counts = self.delimiter_counts
+        index = range(skip, len(counts))
+        if skip or set(counts) != {delimiters} or self.unterminated:
+            excluded = set(self.unterminated)
+            index = [i for i in index if counts[i] == delimiters and i not in excluded]
+        return index
+
+    @property
+    def starts(self) -> list[int]:
+        """The byte offset at which each line of the block starts, and the offset of its end."""
+        if self._starts is None:
+            self._starts = list(accumulate((len(line) + 1 for line in self.lines), initial=self.offset))
+        return self._starts
+
+    def locate(self, i: int) -> tuple[int, int]:
+        """Return the (line number, byte offset) at which the i-th record of the block starts."""
+        line = i if self._record_lines is None else self._record_lines[i]
+        return self.first_line + line, self.starts[line]
+
+    def locate_rows(self, index: range | list[int]) -> tuple[range | list[int], list[int]]:
+        """Return the line numbers and the byte offsets at which the records at *index* start."""
+        starts = self.starts
+        if self._record_lines is None and isinstance(index, range):
+            return range(self.first_line + index.start, self.first_line + index.stop), starts[index.start:index.stop]
+        lines = index if self._record_lines is None else [self._record_lines[i] for i in index]
+        return [self.first_line + line for line in lines], [starts[line] for line in lines]
+
+    def field_index(self, line: int, pos: int) -> int:
+        """
+        Return the 1-based index of the field holding byte *pos* of the block,
+        which is on its *line*-th line (both counted from the start of the block).
+        """
+        if self._records is None:
+            self._parse()
+        r = line if self._record_lines is None else bisect_right(self._record_lines, line) - 1
+        return self.dialect.count(self.data[self.locate(r)[1] - self.offset:pos])[0] + 1
+
+    def cut_open_record(self) -> 'Block | None':
+        """
+        If the block ends inside a quoted field, remove the record holding it
+        and return the bytes from the start of that record on as a new Block,
+        to be joined to the next one. Otherwise return None.
+        """
+        if not self.ends_open:
+            return None
+        r = self._open
+        line = self._record_lines[r]
+        cut = self.locate(r)[1] - self.offset
+        tail = Block(self.buffer, self.offset + cut, 0, self.start + cut, self.end, self.dialect)
+
+        self.end = self.start + cut
+        self._data = self._data[:cut]
+        self._lines = self._lines[:line]
+        self._records = self._records[:r]
+        self._record_lines = self._record_lines[:r]
+        self._delimiter_counts = self._delimiter_counts[:r]
+        self._unterminated.remove(r)
+        self._open = None
+        self._starts = self._starts[:line + 1]
+        return tail
+
+    def join(self, other: 'Block') -> 'Block':
+        """Return a Block of this block's bytes followed by those of *other*, the block that follows it."""
+        if self.buffer is other.buffer and self.end == other.start:
+            return Block(self.buffer, self.offset, 0, self.start, other.end, self.dialect)
+        return Block(self.data + other.data, self.offset, 0, dialect=self.dialect)
+
+
+# ---------------------------------------------------------------------------
+# Bounded samples
+# ---------------------------------------------------------------------------
+
+class LineSample:
+    """
+    Exact count of matching lines with a bounded sample of their locations.
+
+    Keeps the (line, byte offset) of the first *first_n* lines plus a uniform
+    reservoir of *reservoir_size* lines drawn from the rest, so memory stays
+    constant however many lines match. The reservoir uses Algorithm L, which
+    computes how many lines to skip before the next replacement; long runs of
+    matching lines are therefore counted without visiting each one.
+    """
+
+    def __init__(self, first_n: int = SAMPLE_FIRST, reservoir_size: int = SAMPLE_RESERVOIR, seed: int = 0):
+        self.first_n = first_n
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.first: list[tuple[int, int]] = []
+        self.reservoir: list[tuple[int, int]] = []
+        self._rng = random.Random(seed)
+        self._w = 1.0
+        self._next = 0
+
+    def _advance(self, index: int) -> None:
+        """Pick the next match index, at or after *index*, to enter the full reservoir."""
+        rng = self._rng
+        self._w *= math.exp(math.log(rng.random() or 1e-300) / self.reservoir_size)
+        self._next = index + int(math.log(rng.random() or 1e-300) / math.log(1.0 - self._w))
+
+    def add_run(self, n: int, locate) -> None:
+        """
+        Count *n* consecutive matching lines. *locate(i)* returns the
+        (line, byte offset) of the i-th of them and is only called for lines
+        that enter the sample.
+        """
+        start, end = self.count, self.count + n
+        i = start
+        while i < end and len(self.first) < self.first_n:
+            self.first.append(locate(i - start))
+            i += 1
+
+        k = self.reservoir_size
+        while i < end and len(self.reservoir) < k:
+            self.reservoir.append(locate(i - start))
+            i += 1
+            if len(self.reservoir) == k:
+                self._advance(i)
+
+        if k and len(self.reservoir) == k:
+            while self._next < end:
+                self.reservoir[self._rng.randrange(k)] = locate(self._next - start)
+                self._advance(self._next + 1)
+
+        self.count = end
+
+    def add(self, location: tuple[int, int]) -> None:
+        """Count a single matching line at *location*."""
+        self.add_run(1, lambda i: location)
+
+    def merge(self, other: 'LineSample', line_shift: int) -> None:
+        """
+        Append *other*, the sample of lines that follow this sample's lines,
+        adding *line_shift* to its line numbers. The reservoirs are combined by
+        drawing from each side in proportion to the number of lines it stands
+        for, so the result is still a uniform sample. Merged samples are
+        final: add_run() must not be called on them afterwards.
+        """
+        theirs_first = [(line + line_shift, pos) for line, pos in other.first]
+        theirs_reservoir = [(line + line_shift, pos) for line, pos in other.reservoir]
+
+        # Lines of other that fill up this sample's first lines; if any do,
+        # this sample has no reservoir yet
+        take = min(self.first_n - len(self.first), len(theirs_first))
+        self.first.extend(theirs_first[:take])
+
+        # (sampled lines, number of lines they stand for)
+        pools = [
+            (self.reservoir, self.count - len(self.first) + take),
+            (theirs_first[take:], len(theirs_first) - take),
+            (theirs_reservoir, other.count - len(other.first)),
+        ]
+        remaining = [size for _, size in pools]
+        for lines, _ in pools:
+            self._rng.shuffle(lines)
+
+        merged = []
+        while len(merged) < self.reservoir_size and sum(remaining):
+            pick = self._rng.randrange(sum(remaining))
+            side = 0 if pick < remaining[0] else 1 if pick < remaining[0] + remaining[1] else 2
+            merged.append(pools[side][0].pop())
+            remaining[side] -= 1
+        self.reservoir = merged
+        self.count += other.count
+
+    def locations(self) -> list[tuple[int, int]]:
+        """Return the sampled (line, byte offset) pairs in file order."""
+        return self.first + sorted(self.reservoir)
+
+
+# ---------------------------------------------------------------------------
+# Checks
+# ---------------------------------------------------------------------------
+
+def finding(rule: str, line: int | None, offset: int, column: int | None = None, **details) -> dict:
+    """
+    Return a finding of the machine-readable report: the rule ID, the line
+    number and byte offset at which to seek, the 1-based column (field)
+    index, if the finding lies within a field, and any *details*.
+    """
+    return {'rule': rule, 'line': line, 'offset': offset, 'column': column, **details}
+
+
+class Check:
+    """
+    A diagnostic fed by the single-pass scanner.
+
+    *limit* is the number of findings a check records per rule for the
+    machine-readable report; None records just enough for the printed report.
+    Counts are exact either way.
+    """
+
+    def __init__(self, limit: int | None = None):
+        self.limit = limit
+        # Keep one more than is printed so the printed report knows to add '...'
+        self.keep = REPORT_LIMIT + 1 if limit is None else limit
+
+    def header(self, cells: list[bytes]) -> None:
+        """Receive the cells of the file's header record, before any block."""
+
+    def feed(self, block: Block) -> None:
+        """Process the next block of the file."""
+
+    def merge(self, other: 'Check', line_shift: int) -> None:
+        """
+        Fold in *other*, the same check run over the byte range that follows
+        this one's. Its line numbers are relative to the start of its range
+        and are shifted by *line_shift*, the number of lines that precede it.
+        """
+
+    @property
+    def ok(self) -> bool:
+        """True if the check found nothing to report."""
+        return True
+
+    def report(self) -> None:
+        """Print the outcome once the whole file has been scanned."""
+
+    def counts(self) -> dict[str, int]:
+        """Return the number of findings per rule ID, leaving out rules with none."""
+        return {}
+
+    def findings(self) -> list[dict]:
+        """Return the recorded findings (see finding()) once the whole file has been scanned."""
+        return []
+
+
+class BomCheck(Check):
+    """Detects a UTF-8 byte order mark at the start of the file."""
+
+    def __init__(self, limit: int | None = None):
+        super().__init__(limit)
+        self.found = False
+
+    def feed(self, block):
+        if block.offset == 0:
+            self.found = block.buffer[block.start:block.start + len(UTF8_BOM)] == UTF8_BOM
+
+    def merge(self, other, line_shift):
+        self.found = self.found or other.found
+
+    @property
+    def ok(self):
+        return not self.found
+
+    def report(self):
+        if self.found:
             print("❗ UTF-8 BOM detected at start of file (should be removed).")
         else:
             print("✅ No UTF-8 BOM found.")
 
-def check_line_lengths(file_path):
-    col_counts = {}
-    with open(file_path, 'r', encoding='utf-8', newline='') as f:
-        for lineno, line in enumerate(f, 1):
-            cols = line.rstrip('\n').split('\t')
-            count = len(cols)
-            col_counts.setdefault(count, []).append(lineno)
-    if len(col_counts) == 1:
-        count = next(iter(col_counts))
-        print(f"✅ All rows have {count} columns.")
+    def counts(self):
+        return {'bom': 1} if self.found else {}
+
+    def findings(self):
+        return [finding('bom', 1, 0, 1)] if self.found and self.keep else []
+
+
+class Utf8Check(Check):
+    """
+    Reports every invalid UTF-8 sequence with its byte offset and line number,
+    and keeps going, rather than stopping at the first one.
+
+    Each block is decoded in a single call whose error handler records the
+    invalid sequence and resumes after it, so valid text is decoded at codec
+    speed. Blocks end on a newline, which cannot occur inside a multi-byte
+    sequence, so no decoder state needs to be carried between blocks. The
+    error handler is registered once, for every thread, and passes the
+    error on to the check decoding a block in the current thread.
+    """
+
+    ERROR_HANDLER = 'diagnose_tsv.utf8'
+    _decoding = threading.local()
+
+    def __init__(self, limit: int | None = None):
+        super().__init__(limit)
+        self.count = 0
+        # (line, column, byte offset, invalid bytes) of the first invalid sequences
+        self.errors: list[tuple[int, int, int, bytes]] = []
+        self._found: list[tuple[int, int]] = []
+
+    def _collect(self, exc: UnicodeDecodeError):
+        self.count += 1
+        if len(self.errors) + len(self._found) < self.keep:
+            self._found.append((exc.start, exc.end))
+        return '', exc.end
+
+    def feed(self, block):
+        data = block.data
+        self._decoding.check = self
+        try:
+            data.decode('utf-8', self.ERROR_HANDLER)
+        finally:
+            self._decoding.check = None
+        line, last = 0, 0
+        for start, end in self._found:
+            line += data.count(b'\n', last, start)
+            last = start
+            column = block.field_index(line, start)
+            self.errors.append((block.first_line + line, column, block.offset + start, data[start:end]))
+        self._found.clear()
+
+    def merge(self, other, line_shift):
+        self.count += other.count
+        for line, column, offset, sequence in other.errors:
+            if len(self.errors) < self.keep:
+                self.errors.append((line + line_shift, column, offset, sequence))
+
+    @property
+    def ok(self):
+        return not self.count
+
+    def report(self):
+        if not self.count:
+            print("✅ File is valid UTF-8.")
+            return
+        print(f"❗ Invalid UTF-8 byte sequences: {self.count}")
+        for line, _, offset, sequence in self.errors[:REPORT_LIMIT]:
+            print(f"  line {line} (byte {offset}): {sequence!r}")
+        if self.count > REPORT_LIMIT:
+            print("  ...")
+
+    def counts(self):
+        return {'invalid-utf8': self.count} if self.count else {}
+
+    def findings(self):
+        return [
+            finding('invalid-utf8', line, offset, column, bytes=sequence.hex())
+            for line, column, offset, sequence in self.errors
+        ]
+
+
+codecs.register_error(Utf8Check.ERROR_HANDLER, lambda exc: Utf8Check._decoding.check._collect(exc))
+
+
+class ColumnCountCheck(Check):
+    """
+    Histogram of column counts per record.
+
+    Counts are exact; locations are kept as a bounded LineSample per column
+    count. Only counts that differ from the header's are offending, so the
+    header's own count keeps just its first lines and no reservoir. With a
+    *limit*, offending counts keep their first *limit* lines and no random
+    reservoir, so that the findings are the same from run to run.
+    """
+
+    def __init__(self, limit: int | None = None):
+        super().__init__(limit)
+        self.expected: int | None = None
+        self.histogram: dict[int, LineSample] = {}
+
+    def _bucket(self, count: int) -> LineSample:
+        bucket = self.histogram.get(count)
+        if bucket is None:
+            if count == self.expected:
+                bucket = LineSample(reservoir_size=0, seed=count)
+            elif self.limit is None:
+                bucket = LineSample(seed=count)
+            else:
+                bucket = LineSample(first_n=self.limit, reservoir_size=0, seed=count)
+            self.histogram[count] = bucket
+        return bucket
+
+    def header(self, cells):
+        self.expected = len(cells)
+
+    def feed(self, block):
+        run_start = 0
+        for delimiters, run in groupby(block.delimiter_counts):
+            n = sum(1 for _ in run)
+            self._bucket(delimiters + 1).add_run(n, lambda i, s=run_start: block.locate(s + i))
+            run_start += n
+
+    def merge(self, other, line_shift):
+        for count, bucket in other.histogram.items():
+            self._bucket(count).merge(bucket, line_shift)
+
+    @property
+    def ok(self):
+        return len(self.histogram) == 1
+
+    def report(self):
+        if not self.histogram:
+            print("❗ File contains no lines.")
+        elif len(self.histogram) == 1:
+            count = next(iter(self.histogram))
+            print(f"✅ All rows have {count} columns.")
+        else:
+            print(f"❗ Inconsistent column counts detected (header has {self.expected} columns):")
+            for count, bucket in sorted(self.histogram.items()):
+                sample = ", ".join(f"{line} (byte {pos})" for line, pos in bucket.locations())
+                more = "..." if bucket.count > len(bucket.first) + len(bucket.reservoir) else ""
+                print(f"  {count} columns: {bucket.count} lines (e.g., lines {sample}{more})")
+
+    def _offending(self):
+        return [(count, bucket) for count, bucket in self.histogram.items() if count != self.expected]
+
+    def counts(self):
+        if not self.histogram:
+            return {'empty-file': 1}
+        total = sum(bucket.count for _, bucket in self._offending())
+        return {'column-count': total} if total else {}
+
+    def findings(self):
+        if not self.histogram:
+            return [finding('empty-file', None, 0)] if self.keep else []
+        found = [
+            finding('column-count', line, offset, columns=count, expected=self.expected)
+            for count, bucket in self._offending()
+            for line, offset in bucket.locations()
+        ]
+        return sorted(found, key=itemgetter('offset'))
+
+
+class QuoteCheck(Check):
+    """Finds quoted fields that are never closed, which swallow the rest of the file."""
+
+    def __init__(self, limit: int | None = None):
+        super().__init__(limit)
+        self.count = 0
+        # (line, byte offset) of the first unterminated quoted fields
+        self.locations: list[tuple[int, int]] = []
+
+    def feed(self, block):
+        for i in block.unterminated:
+            self.count += 1
+            if len(self.locations) < self.keep:
+                self.locations.append(block.locate(i))
+
+    def merge(self, other, line_shift):
+        self.count += other.count
+        for line, offset in other.locations:
+            if len(self.locations) < self.keep:
+                self.locations.append((line + line_shift, offset))
+
+    @property
+    def ok(self):
+        return not self.count
+
+    def report(self):
+        if not self.count:
+            print("✅ All quoted fields are closed.")
+            return
+        print(f"❗ Unterminated quoted fields: {self.count}")
+        for line, offset in self.locations[:REPORT_LIMIT]:
+            print(f"  line {line} (byte {offset})")
+        if self.count > REPORT_LIMIT:
+            print("  ...")
+
+    def counts(self):
+        return {'unterminated-quote': self.count} if self.count else {}
+
+    def findings(self):
+        return [finding('unterminated-quote', line, offset) for line, offset in self.locations]
+
+
+class InvisibleCharsCheck(Check):
+    """
+    Finds lines containing carriage returns or other control characters.
+
+    Control characters are counted by deleting them from the bytes of the
+    block with bytes.translate, several times faster than a regular
+    expression, and carriage returns are looked for in the buffer directly,
+    in the memory map when the file is mapped; a clean block goes no
+    further. Only the blocks with a hit are searched, in the buffer, and
+    only the bytes around a hit are copied and decoded, to report its line,
+    column and context. The printed report
+    shows the first hit on each line; with a *limit*, every character is a
+    finding.
+    """
+
+    def __init__(self, limit: int | None = None):
+        super().__init__(limit)
+        self.carriage_count = 0
+        self.control_count = 0
+        # (line, character column, field index, byte offset, context) of the first hits
+        self.carriage_hits = []
+        self.control_hits = []
+
+    def _wants(self, hits) -> bool:
+        return len(hits) < self.keep
+
+    def feed(self, block):
+        buffer, pos, end = block.buffer, block.start, block.end
+        data = block.data
+        control_count = len(data) - len(data.translate(None, CONTROL_BYTES))
+        carriage_count = data.count(b'\r') if buffer.find(b'\r', pos, end) != -1 else 0
+        if not carriage_count and not control_count:
+            return
+        self.carriage_count += carriage_count
+        self.control_count += control_count
+
+        line, counted = block.first_line, block.start
+        while True:
+            want_carriage = carriage_count and self._wants(self.carriage_hits)
+            want_control = control_count and self._wants(self.control_hits)
+            if want_carriage and want_control:
+                pattern = INVISIBLE_CHARS
+            elif want_carriage or want_control:
+                pattern = CARRIAGE_RETURN if want_carriage else CONTROL_CHARS
+            else:
+                return
+            match = pattern.search(buffer, pos, end)
+            if match is None:
+                return
+
+            hit = match.start()
+            line += buffer[counted:hit].count(b'\n')
+            counted = pos = hit + 1
+            hits = self.carriage_hits if buffer[hit:hit + 1] == b'\r' else self.control_hits
+            if self.limit is None and hits and hits[-1][0] == line:
+                continue
+
+            line_start = buffer.rfind(b'\n', block.start, hit) + 1 or block.start
+            line_end = buffer.find(b'\n', hit, end)
+            if line_end == -1:
+                line_end = end
+            context = buffer[max(line_start, hit - CONTEXT_BYTES):min(line_end, hit + CONTEXT_BYTES + 1)]
+            column = len(buffer[line_start:hit].decode('utf-8', 'replace')) + 1
+            field = block.field_index(line - block.first_line, hit - block.start)
+            hits.append((line, column, field, block.offset + hit - block.start, context.decode('utf-8', 'replace')))
+
+    def merge(self, other, line_shift):
+        self.carriage_count += other.carriage_count
+        self.control_count += other.control_count
+        for mine, theirs in ((self.carriage_hits, other.carriage_hits), (self.control_hits, other.control_hits)):
+            for line, column, field, offset, context in theirs:
+                if self._wants(mine):
+                    mine.append((line + line_shift, column, field, offset, context))
+
+    @property
+    def ok(self):
+        return not self.carriage_count and not self.control_count
+
+    def report(self):
+        def sample(hits):
+            lines = [line for line, *_ in hits]
+            return f"{lines[:REPORT_LIMIT]}{'...' if len(lines) > REPORT_LIMIT else ''}"
+
+        def details(hits):
+            for line, column, _, offset, context in hits[:REPORT_LIMIT]:
+                print(f"  line {line}, column {column} (byte {offset}): {context!r}")
+
+        if self.carriage_hits:
+            print(f"❗ Lines with carriage returns (\\r): {sample(self.carriage_hits)}")
+        else:
+            print("✅ No carriage return characters found.")
+
+        if self.control_hits:
+            print(f"❗ Lines with control characters: {sample(self.control_hits)}")
+            details(self.control_hits)
+        else:
+            print("✅ No control characters found.")
+
+    def counts(self):
+        counts = {'carriage-return': self.carriage_count, 'control-char': self.control_count}
+        return {rule: n for rule, n in counts.items() if n}
+
+    def findings(self):
+        return sorted((
+            finding(rule, line, offset, field, character=column, context=context)
+            for rule, hits in (('carriage-return', self.carriage_hits), ('control-char', self.control_hits))
+            for line, column, field, offset, context in hits
+        ), key=itemgetter('offset'))
+
+
+class SchemaCheck(Check):
+    """
+    Checks the header and cell values against a DwC-DP table schema.
+
+    Values are checked a column at a time over each block rather than cell by
+    cell: a numeric column is screened for foreign bytes and converted with
+    one map(int/float), which also feeds a single min()/max() for the range
+    constraints; booleans are checked with a set difference and required
+    fields with a single membership test. Cells are only visited individually
+    to locate the offenders once a column fails. Records are split no further
+    than the last column that has something to check, and rows whose column
+    count differs from the header are left to ColumnCountCheck.
+    """
+
+    def __init__(self, schema: dict, limit: int | None = None):
+        super().__init__(limit)
+        self.schema = schema
+        self.fields = {f['name']: f for f in schema.get('fields', [])}
+        self.labels: list[str] | None = None
+        self.columns: list[tuple[int, dict]] = []
+        # (field name, rule) -> LineSample of offending cells
+        self.problems: dict[tuple[str, str], LineSample] = {}
+
+    @staticmethod
+    def _needs_check(field: dict) -> bool:
+        constraints = field.get('constraints') or {}
+        return field.get('type') in NUMERIC_TYPES or field.get('type') == 'boolean' \
+            or bool(constraints.get('required'))
+
+    def header(self, cells):
+        cells = [cells[0].removeprefix(UTF8_BOM)] + cells[1:]
+        self.labels = [cell.decode('utf-8', 'replace') for cell in cells]
+        self.columns = [
+            (index, self.fields[name])
+            for index, name in enumerate(self.labels)
+            if name in self.fields and self._needs_check(self.fields[name])
+        ]
+
+    def _sample(self, key: tuple[str, str]) -> LineSample:
+        sample = self.problems.get(key)
+        if sample is None:
+            first_n = SAMPLE_FIRST if self.limit is None else self.limit
+            sample = self.problems[key] = LineSample(first_n=first_n, reservoir_size=0)
+        return sample
+
+    def _record(self, name: str, rule: str, indices, locate) -> None:
+        # The sample is only made for a first problem: ok means no samples
+        sample = None
+        for i in indices:
+            if sample is None:
+                sample = self._sample((name, rule))
+            sample.add(locate(i))
+
+    def merge(self, other, line_shift):
+        for key, sample in other.problems.items():
+            if sample.count:
+                self._sample(key).merge(sample, line_shift)
+
+    def feed(self, block):
+        if not self.columns:
+            return
+        # Keep only rows with the header's column count; index maps row -> record
+        index = block.row_index(len(self.labels))
+        if not index:
+            return
+
+        last = max(column for column, _ in self.columns)
+        rows = block.rows(index, last + 1)
+
+        def locate(i):
+            return block.locate(index[i])
+
+        for column, field in self.columns:
+            self._check_column(field, list(map(itemgetter(column), rows)), locate)
+
+    def _check_column(self, field: dict, column: list[bytes], locate) -> None:
+        name = field['name']
+        field_type = field.get('type')
+        constraints = field.get('constraints') or {}
+
+        if constraints.get('required') and b'' in column:
+            self._record(name, 'required', (i for i, v in enumerate(column) if not v), locate)
+
+        if field_type == 'boolean':
+            allowed = {
+                v.encode() for v in
+                field.get('trueValues', DEFAULT_TRUE_VALUES) + field.get('falseValues', DEFAULT_FALSE_VALUES)
+            }
+            allowed.add(b'')
+            if not set(column) <= allowed:
+                self._record(name, 'type', (i for i, v in enumerate(column) if v not in allowed), locate)
+            return
+
+        if field_type not in NUMERIC_TYPES:
+            return
+        pattern, charset, convert = NUMERIC_TYPES[field_type]
+        try:
+            if b''.join(column).translate(None, charset):
+                raise ValueError
+            values = list(map(convert, filter(None, column)))
+            bad = set()
+        except ValueError:
+            bad = {i for i, v in enumerate(column) if v and not pattern.fullmatch(v)}
+            self._record(name, 'type', sorted(bad), locate)
+            values = [convert(v) for i, v in enumerate(column) if v and i not in bad]
+        if not values:
+            return
+
+        low, high = constraints.get('minimum'), constraints.get('maximum')
+        if low is not None and min(values) < low:
+            self._record(name, 'minimum', (
+                i for i, v in enumerate(column) if v and i not in bad and convert(v) < low
+            ), locate)
+        if high is not None and max(values) > high:
+            self._record(name, 'maximum', (
+                i for i, v in enumerate(column) if v and i not in bad and convert(v) > high
+            ), locate)
+
+    def _header_problems(self) -> tuple[list[str], list[str]]:
+        """Return the header columns not in the schema and the missing required fields."""
+        unknown = [name for name in self.labels if name not in self.fields]
+        missing = [
+            name for name, field in self.fields.items()
+            if name not in self.labels and (field.get('constraints') or {}).get('required')
+        ]
+        return unknown, missing
+
+    @property
+    def ok(self):
+        return self.labels is not None and not self.problems and self._header_problems() == ([], [])
+
+    def report(self):
+        table = self.schema.get('name', '<unnamed>')
+        if self.labels is None:
+            print(f"❗ No header to check against the '{table}' schema.")
+            return
+
+        unknown, missing = self._header_problems()
+        if unknown:
+            print(f"❗ Columns not in the '{table}' schema: {unknown}")
+        if missing:
+            print(f"❗ Required '{table}' fields missing from the header: {missing}")
+        if not unknown and not missing:
+            print(f"✅ Header matches the '{table}' schema fields.")
+
+        if not self.problems:
+            print(f"✅ All values conform to the '{table}' schema.")
+            return
+        for (name, rule), sample in sorted(self.problems.items()):
+            field = self.fields[name]
+            if rule == 'required':
+                problem = "empty values in a required field"
+            elif rule == 'type':
+                problem = f"values that are not a valid {field['type']}"
+            else:
+                problem = f"values beyond {rule} {field['constraints'][rule]}"
+            lines = ", ".join(str(line) for line, _ in sample.locations())
+            more = "..." if sample.count > len(sample.first) else ""
+            print(f"❗ '{name}': {sample.count} {problem} (e.g., lines {lines}{more})")
+
+    def counts(self):
+        if self.labels is None:
+            return {'schema-no-header': 1}
+        unknown, missing = self._header_problems()
+        counts = Counter({'schema-unknown-column': len(unknown), 'schema-missing-field': len(missing)})
+        for (_, rule), sample in self.problems.items():
+            counts[f'schema-{rule}'] += sample.count
+        return {rule: n for rule, n in sorted(counts.items()) if n}
+
+    def findings(self):
+        if self.labels is None:
+            return [finding('schema-no-header', None, 0)] if self.keep else []
+        unknown, missing = self._header_problems()
+        found = [
+            finding('schema-unknown-column', 1, 0, index + 1, field=name)
+            for index, name in enumerate(self.labels) if name in unknown
+        ][:self.keep]
+        found += [finding('schema-missing-field', 1, 0, field=name) for name in missing[:self.keep]]
+        rows = []
+        for (name, rule), sample in sorted(self.problems.items()):
+            column = self.labels.index(name) + 1
+            rows += [finding(f'schema-{rule}', line, offset, column, field=name) for line, offset in sample.locations()]
+        # A rule's findings are kept per field; keep its first across all fields
+        kept = Counter()
+        for item in sorted(rows, key=itemgetter('offset', 'column')):
+            kept[item['rule']] += 1
+            if kept[item['rule']] <= self.keep:
+                found.append(item)
+        return found
+
+
+class FixWriter(Check):
+    """
+    Writes a repaired copy of the file to *out* as the blocks go by: the BOM
+    is dropped, CRLF line endings become LF, and control characters are
+    removed or, with control='escape', replaced by a visible \\xNN escape.
+    A lone CR is a line ending, and becomes LF, only in a file without any
+    LF; elsewhere, within a line or a quoted field, it is a control
+    character like the others. Each block is repaired with a few bytes.replace and one
+    regex substitution, so memory stays at one block however large the file.
+    Other problems, such as invalid UTF-8 or wrong column counts, are only
+    diagnosed.
+    """
+
+    def __init__(self, out, control: str = 'remove'):
+        super().__init__()
+        self.out = out
+        self.control = control
+        self.bom = False
+        self.crlf = 0
+        self.carriage_returns = 0
+        self.control_chars = 0
+        # Whether an LF has been seen: lone CRs are then not line endings
+        self.lf = False
+
+    def _escape(self, match) -> bytes:
+        return b'\\x%02X' % match.group()[0]
+
+    def feed(self, block):
+        data = block.data
+        if block.offset == 0 and data.startswith(UTF8_BOM):
+            self.bom = True
+            data = data[len(UTF8_BOM):]
+        # Blocks end at an LF, so a block without one is all that is left of a file without one
+        self.lf = self.lf or b'\n' in data
+        if b'\r' in data:
+            crlf = data.count(b'\r\n')
+            if crlf:
+                self.crlf += crlf
+                data = data.replace(b'\r\n', b'\n')
+            if not self.lf:
+                carriage_returns = data.count(b'\r')
+                if carriage_returns:
+                    self.carriage_returns += carriage_returns
+                    data = data.replace(b'\r', b'\n')
+        control_chars = INVISIBLE_CHARS if self.lf else CONTROL_CHARS
+        if control_chars.search(data):
+            data, n = control_chars.subn(self._escape if self.control == 'escape' else b'', data)
+            self.control_chars += n
+        self.out.write(data)
+
+    @property
+    def changed(self) -> bool:
+        return self.bom or bool(self.crlf or self.carriage_returns or self.control_chars)
+
+    def repairs(self) -> dict:
+        """Return what was repaired, for the machine-readable report."""
+        return {
+            'bom': self.bom,
+            'crlf': self.crlf,
+            'carriage_returns': self.carriage_returns,
+            'control_chars': self.control_chars,
+            'control': self.control,
+        }
+
+    def report(self):
+        if not self.changed:
+            print("🔧 Nothing to fix; the file was left unchanged.")
+            return
+        print("🔧 Repaired file written:")
+        if self.bom:
+            print("  removed the UTF-8 BOM")
+        if self.crlf:
+            print(f"  converted {self.crlf} CRLF line endings to LF")
+        if self.carriage_returns:
+            print(f"  converted {self.carriage_returns} lone carriage returns to LF")
+        if self.control_chars:
+            print(f"  {'escaped' if self.control == 'escape' else 'removed'} {self.control_chars} control characters")
+
+
+def load_table_schema(table: str, schemas_dir: Path) -> dict | None:
+    """Load the table schema for *table* from *schemas_dir*, or None if absent."""
+    try:
+        with open(schemas_dir / f'{table}.json', 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def make_checks(schema: dict | None = None, dialect: Dialect = TSV, limit: int | None = None) -> list[Check]:
+    """
+    Return the checks to run, in reporting order, each recording up to
+    *limit* findings per rule (see Check).
+    """
+    checks = [BomCheck(limit), Utf8Check(limit), ColumnCountCheck(limit)]
+    if dialect.quotechar is not None:
+        checks.append(QuoteCheck(limit))
+    checks.append(InvisibleCharsCheck(limit))
+    if schema is not None:
+        checks.append(SchemaCheck(schema, limit))
+    return checks
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+def split_archive_path(file_path) -> tuple[str, str] | None:
+    """
+    Return (archive, member) if *file_path* names a member of a zip archive,
+    written as the archive path followed by the member name, e.g.
+    package.zip/event.tsv; otherwise None.
+    """
+    path = Path(file_path)
+    for parent in path.parents:
+        if parent.suffix.lower() == '.zip' and parent.is_file():
+            return str(parent), path.relative_to(parent).as_posix()
+    return None
+
+
+def plain_file(file_path) -> bool:
+    """True if *file_path* is read as it is on disk: neither compressed nor in an archive."""
+    return Path(file_path).suffix.lower() not in DECOMPRESSORS and split_archive_path(file_path) is None
+
+
+@contextmanager
+def open_input(file_path):
+    """
+    Open *file_path* for binary reading: a regular file, a zip archive member
+    (see split_archive_path) or either of these compressed with gzip, bzip2
+    or xz. Archive members and compressed data are streamed and decompressed
+    as they are read, without extracting anything to disk.
+    """
+    with ExitStack() as stack:
+        archived = split_archive_path(file_path)
+        if archived is None:
+            f = stack.enter_context(open(file_path, 'rb'))
+        else:
+            archive, member = archived
+            zf = stack.enter_context(zipfile.ZipFile(archive))
+            try:
+                f = stack.enter_context(zf.open(member))
+            except KeyError:
+                raise FileNotFoundError(f"No member '{member}' in archive: {archive}") from None
+        decompressor = DECOMPRESSORS.get(Path(file_path).suffix.lower())
+        if decompressor is not None:
+            f = stack.enter_context(decompressor(f))
+        yield f
+
+
+def archive_package_dir(archive: Path) -> Path | None:
+    """
+    Return the path, within zip *archive*, of the data package it holds: the
+    archive itself, or the folder of its shallowest datapackage.json. Return
+    None if there is no datapackage.json.
+    """
+    with zipfile.ZipFile(archive) as zf:
+        names = [name for name in zf.namelist() if Path(name).name == PACKAGE_DESCRIPTOR]
+    if not names:
+        return None
+    return (archive / min(names, key=lambda name: name.count('/'))).parent
+
+
+# ---------------------------------------------------------------------------
+# Scanner
+# ---------------------------------------------------------------------------
+
+def iter_blocks(f, chunk_size: int = CHUNK_SIZE, limit: int | None = None):
+    """
+    Read binary file object *f* in chunks of *chunk_size* bytes, stopping
+    after *limit* bytes if given, and yield blocks that each end on a line
+    boundary. Only the final block may lack a trailing newline.
+    """
+    carry = b''
+    while limit is None or limit > 0:
+        chunk = f.read(chunk_size if limit is None else min(chunk_size, limit))
+        if not chunk:
+            break
+        if limit is not None:
+            limit -= len(chunk)
+        data = carry + chunk if carry else chunk
+        cut = data.rfind(b'\n') + 1
+        if cut == 0:
+            # No newline yet: a single line longer than the chunk size
+            carry = data
+            continue
+        carry = data[cut:]
+        yield data[:cut] if carry else data
+    if carry:
+        yield carry
+
+
+def iter_mapped_blocks(mm: mmap.mmap, start: int, end: int, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield (start, end) positions of blocks of about *chunk_size* bytes of
+    memory map *mm* between *start* and *end*, each ending on a line boundary.
+    """
+    while start < end:
+        stop = min(start + chunk_size, end)
+        if stop < end:
+            cut = mm.rfind(b'\n', start, stop) + 1
+            if cut == 0:
+                # A single line longer than the chunk size
+                cut = mm.find(b'\n', stop, end) + 1 or end
+            stop = cut
+        yield start, stop
+        start = stop
+
+
+def map_file(f) -> mmap.mmap | None:
+    """Memory-map open file *f* read-only, or return None if it cannot be mapped (e.g. empty)."""
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if hasattr(mm, 'madvise'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    return mm
+
+
+def align_records(blocks):
+    """
+    Yield *blocks* cut back so that none ends inside a quoted field: the
+    record a block leaves open is carried over and completed by the next
+    block. Only the final block may end inside a quoted field.
+    """
+    tail = None
+    for block in blocks:
+        if tail is not None:
+            block = tail.join(block)
+        tail = block.cut_open_record()
+        if block.start < block.end:
+            yield block
+    if tail is not None:
+        yield tail
+
+
+def split_ranges(file_path: str, parts: int) -> list[tuple[int, int]]:
+    """
+    Split *file_path* into at most *parts* (start, end) byte ranges of similar
+    size, each starting at the beginning of a line. A range may start inside
+    a quoted field that spans lines; scan_range() reports when the previous
+    range ended inside one.
+    """
+    size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, parts):
+            # Move to the start of the first line that begins at or after the cut
+            f.seek(max(size * i // parts - 1, bounds[-1]))
+            f.readline()
+            start = f.tell()
+            if start >= size:
+                break
+            if start > bounds[-1]:
+                bounds.append(start)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def scan_range(file_path: str, checks: list[Check], dialect: Dialect = TSV,
+               start: int = 0, end: int | None = None) -> tuple[int, bool]:
+    """
+    Feed the record-aligned blocks of *file_path* between byte *start*, which
+    must begin a line, and *end* to each check, after handing every check the
+    cells of the file's header. Byte offsets are absolute, but line numbers
+    count from 1 at *start*. Returns the number of newlines scanned and
+    whether the range ended inside a quoted field.
+    """
+    line = 1
+    block = None
+    with open_input(file_path) as f:
+        if start:
+            header = dialect.split(f.readline().rstrip(b'\n').removesuffix(b'\r'))
+            for check in checks:
+                check.header(header)
+            f.seek(start)
+
+        mm = map_file(f) if plain_file(file_path) else None
+        if mm is not None:
+            end = len(mm) if end is None else end
+            blocks = (Block(mm, pos, 0, pos, stop, dialect) for pos, stop in iter_mapped_blocks(mm, start, end))
+        else:
+            blocks = _read_blocks(f, start, end, dialect)
+
+        for block in align_records(blocks):
+            block.first_line = line
+            if block.offset == 0:
+                header = block.cells(0)
+                for check in checks:
+                    check.header(header)
+            for check in checks:
+                check.feed(block)
+            line += block.data.count(b'\n')
+        ends_open = block is not None and block.ends_open
+        if mm is not None:
+            mm.close()
+    return line - 1, ends_open
+
+
+def _read_blocks(f, start: int, end: int | None, dialect: Dialect):
+    """Yield Blocks read from open file *f*, positioned at byte *start*, up to byte *end*."""
+    offset = start
+    for data in iter_blocks(f, limit=None if end is None else end - start):
+        yield Block(data, offset, 0, dialect=dialect)
+        offset += len(data)
+
+
+def _scan_task(task: tuple[str, dict | None, Dialect, int | None, int, int | None]) -> tuple[list[Check], int, bool] | str:
+    """Worker entry point: scan one byte range, or return an error message if the file cannot be read."""
+    file_path, schema, dialect, limit, start, end = task
+    checks = make_checks(schema, dialect, limit)
+    try:
+        return checks, *scan_range(file_path, checks, dialect, start, end)
+    except READ_ERRORS as exc:
+        return str(exc)
+
+
+def diagnose_files(files: list[tuple[str, dict | None, Dialect]], jobs: int, limit: int | None = None):
+    """
+    Run all checks over each (file path, table schema, dialect) in *files*,
+    recording up to *limit* findings per rule, and yield, in order, either
+    the checks ready to report or an error message. With more than one job
+    the work is spread over a process pool: uncompressed files of at least
+    PARALLEL_MIN_SIZE on disk are split into up to *jobs* line-aligned
+    ranges, and the checks of a file's ranges are merged in file order;
+    streamed inputs are scanned in one piece. If a range turns out to start
+    inside a quoted field, the file is scanned again in one piece.
+    """
+    plans = []
+    for file_path, schema, dialect in files:
+        try:
+            size = os.path.getsize(file_path) if plain_file(file_path) else 0
+            parts = min(jobs, size // PARALLEL_MIN_SIZE) if size >= PARALLEL_MIN_SIZE else 1
+            ranges = split_ranges(file_path, parts) if parts > 1 else [(0, None)]
+        except OSError:
+            # Let the scan report the error
+            ranges = [(0, None)]
+        plans.append([(file_path, schema, dialect, limit, start, end) for start, end in ranges])
+
+    tasks = [task for plan in plans for task in plan]
+    if jobs > 1 and len(tasks) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(jobs, len(tasks)))
+        outcomes = pool.map(_scan_task, tasks)
     else:
-        print("❗ Inconsistent column counts detected:")
-        for count, lines in sorted(col_counts.items()):
-            sample = ", ".join(map(str, lines[:3])) + ("..." if len(lines) > 3 else "")
-            print(f"  {count} columns: {len(lines)} lines (e.g., lines {sample})")
-
-def check_invisible_chars(file_path):
-    ctrl_chars = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
-    carriage_lines = []
-    control_lines = []
-
-    with open(file_path, 'r', encoding='utf-8', newline='') as f:
-        for lineno, line in enumerate(f, 1):
-            if '\r' in line:
-                carriage_lines.append(lineno)
-            if ctrl_chars.search(line):
-                control_lines.append(lineno)
-
-    if carriage_lines:
-        print(f"❗ Lines with carriage returns (\\r): {carriage_lines[:5]}{'...' if len(carriage_lines) > 5 else ''}")
+        pool = None
+        outcomes = map(_scan_task, tasks)
+
+    try:
+        for plan in plans:
+            results = [next(outcomes) for _ in plan]
+            errors = [result for result in results if isinstance(result, str)]
+            if errors:
+                yield errors[0]
+                continue
+            if any(ends_open for _, _, ends_open in results[:-1]):
+                # A range boundary fell inside a quoted field spanning lines
+                file_path, schema, dialect, limit, _, _ = plan[0]
+                results = [_scan_task((file_path, schema, dialect, limit, 0, None))]
+                if isinstance(results[0], str):
+                    yield results[0]
+                    continue
+            checks, line_shift, _ = results[0]
+            for others, lines, _ in results[1:]:
+                for check, other in zip(checks, others):
+                    check.merge(other, line_shift)
+                line_shift += lines
+            yield checks
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def fix_file(file_path: str, schema: dict | None, dialect: Dialect, control: str = 'remove',
+             report: 'JsonReport | None' = None) -> int:
+    """
+    Diagnose *file_path* and, in the same pass, write a repaired copy to a
+    temporary file next to it, which then atomically replaces the original.
+    The diagnostics describe the file as it was before the repair. They are
+    printed, or added to *report* if given, and the exit status is returned.
+    """
+    directory, name = os.path.split(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            checks = make_checks(schema, dialect, None if report is None else report.max_findings)
+            fixer = FixWriter(out, control)
+            scan_range(file_path, checks + [fixer], dialect)
+            out.flush()
+            os.fsync(out.fileno())
+        if fixer.changed:
+            shutil.copymode(file_path, temp_path)
+            os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    if report is not None:
+        report.add(file_path, checks, fixer.repairs())
     else:
-        print("✅ No carriage return characters found.")
+        report_file(file_path, checks)
+        fixer.report()
+    return outcome_status(checks)
+
+
+def report_file(file_path: str, checks: list[Check]) -> None:
+    """Print the report of every check run over *file_path*."""
+    print(f"🔍 Running diagnostics on: {file_path}\n")
+    for check in checks:
+        check.report()
+
+
+def outcome_status(outcome: list[Check] | str) -> int:
+    """Return the exit status for the outcome of diagnose_files() for one file."""
+    if isinstance(outcome, str):
+        return EXIT_READ_ERROR
+    return EXIT_OK if all(check.ok for check in outcome) else EXIT_FINDINGS
+
+
+# ---------------------------------------------------------------------------
+# Machine-readable report
+# ---------------------------------------------------------------------------
+
+class JsonReport:
+    """
+    The report written with --format json or ndjson, recording up to
+    *max_findings* findings per rule and file.
+
+    Each file gets an entry with the exact number of findings per rule ID,
+    the rules whose findings were cut short by *max_findings*, and its
+    findings in byte offset order. With ndjson, every finding is written on
+    a line of its own as soon as its file is done, followed by a line for
+    the file; with json, a single document holding every file is written
+    by close().
+    """
 
-    if control_lines:
-        print(f"❗ Lines with control characters: {control_lines[:5]}{'...' if len(control_lines) > 5 else ''}")
+    def __init__(self, fmt: str, max_findings: int = DEFAULT_MAX_FINDINGS, package: str | None = None, out=None):
+        self.fmt = fmt
+        self.max_findings = max_findings
+        self.package = package
+        self.out = sys.stdout if out is None else out
+        self.files: list[dict] = []
+
+    def _write(self, item: dict) -> None:
+        self.out.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+    def add(self, file_path, outcome: list[Check] | str, repairs: dict | None = None) -> None:
+        """Add the outcome of diagnose_files() for *file_path*, and what --fix repaired, if anything."""
+        entry = {'file': str(file_path), 'ok': outcome_status(outcome) == EXIT_OK}
+        findings = []
+        if isinstance(outcome, str):
+            entry['error'] = outcome
+        else:
+            counts = {}
+            for check in outcome:
+                counts.update(check.counts())
+                findings += check.findings()
+            findings.sort(key=itemgetter('offset'))
+            recorded = Counter(item['rule'] for item in findings)
+            entry['counts'] = counts
+            entry['truncated'] = sorted(rule for rule, n in counts.items() if n > recorded[rule])
+        if repairs is not None:
+            entry['repaired'] = repairs
+
+        if self.fmt == 'ndjson':
+            for item in findings:
+                self._write({'type': 'finding', 'file': entry['file'], **item})
+            self._write({'type': 'file', **entry})
+        else:
+            entry['findings'] = findings
+        self.files.append(entry)
+
+    def close(self) -> None:
+        """Finish the report once every file has been added."""
+        failed = sum(1 for entry in self.files if not entry['ok'])
+        if self.fmt == 'ndjson':
+            if self.package is not None:
+                self._write({'type': 'package', 'package': self.package, 'files': len(self.files), 'failed': failed})
+        else:
+            document = {'ok': not failed, 'files': self.files}
+            if self.package is not None:
+                document = {'package': self.package, **document}
+            json.dump(document, self.out, ensure_ascii=False, indent=2)
+            self.out.write('\n')
+        self.out.flush()
+
+
+# ---------------------------------------------------------------------------
+# Data packages
+# ---------------------------------------------------------------------------
+
+def default_jobs() -> int:
+    """Number of CPU cores available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resource_dialect(resource: dict, path: str) -> Dialect:
+    """
+    Return the dialect of file *path* of a data package *resource*, from its
+    Frictionless CSV dialect and format, falling back to the file extension.
+    """
+    declared = resource.get('dialect')
+    declared = declared if isinstance(declared, dict) else {}
+    delimiter = declared.get('delimiter') or {'csv': ',', 'tsv': '\t'}.get(resource.get('format'))
+    try:
+        return Dialect.for_file(path, delimiter, declared.get('quoteChar', '"'), declared.get('escapeChar'))
+    except ValueError as exc:
+        print(f"Warning: Ignoring the dialect of resource '{resource.get('name', '<unnamed>')}': {exc}", file=sys.stderr)
+        return Dialect.for_file(path)
+
+
+def package_resources(package_dir: Path, schemas_dir: Path | None) -> list[tuple[str, Path, dict | None, Dialect]]:
+    """
+    Return (resource name, file path, table schema, dialect) for every local
+    file listed in the resources of *package_dir*/datapackage.json, where
+    *package_dir* may be a folder within a zip archive. Schemas
+    are only looked up when *schemas_dir* is given: an inline schema is used
+    as is, otherwise the schema named by the resource's schema URL (or,
+    failing that, by the resource name) is loaded from *schemas_dir*.
+    """
+    with open_input(package_dir / PACKAGE_DESCRIPTOR) as f:
+        descriptor = json.load(f)
+
+    resources = []
+    for resource in descriptor.get('resources', []):
+        name = resource.get('name', '<unnamed>')
+        paths = resource.get('path', [])
+        if isinstance(paths, str):
+            paths = [paths]
+
+        schema = None
+        if schemas_dir is not None:
+            declared = resource.get('schema')
+            if isinstance(declared, dict):
+                schema = declared
+            else:
+                table = Path(urlparse(declared).path).stem if isinstance(declared, str) else name
+                schema = load_table_schema(table, schemas_dir) or load_table_schema(name, schemas_dir)
+                if schema is None:
+                    print(f"Warning: No table schema for resource '{name}'; checking structure only.", file=sys.stderr)
+
+        for path in paths:
+            if urlparse(path).scheme:
+                print(f"Warning: Skipping remote resource '{name}': {path}", file=sys.stderr)
+                continue
+            resources.append((name, package_dir / path, schema, resource_dialect(resource, path)))
+    return resources
+
+
+def diagnose_package(package_dir: Path, schemas_dir: Path | None, jobs: int,
+                     report: JsonReport | None = None) -> int:
+    """
+    Diagnose every resource of a data package in parallel, then print a
+    summary, or add each resource to *report* if given. Returns the exit
+    status: the most severe of the resources'.
+    """
+    resources = package_resources(package_dir, schemas_dir)
+    if report is None:
+        print(f"📦 Diagnosing {len(resources)} resource file(s) of {package_dir} with {jobs} worker(s)\n")
+
+    failed = []
+    status = EXIT_OK
+    files = [(file_path, schema, dialect) for _, file_path, schema, dialect in resources]
+    limit = None if report is None else report.max_findings
+    # Outcomes arrive in resource order, so reports come out in a stable order
+    for (name, file_path, _, _), outcome in zip(resources, diagnose_files(files, jobs, limit)):
+        status = max(status, outcome_status(outcome))
+        if outcome_status(outcome) != EXIT_OK:
+            failed.append((name, file_path))
+        if report is not None:
+            report.add(file_path, outcome)
+        elif isinstance(outcome, str):
+            print(f"❗ Could not read resource '{name}': {outcome}\n")
+        else:
+            report_file(str(file_path), outcome)
+            print()
+
+    if report is not None:
+        report.close()
+    elif failed:
+        print(f"📦 Summary: {len(failed)} of {len(resources)} resource file(s) have problems:")
+        for name, file_path in failed:
+            print(f"  ❗ {name} ({file_path})")
     else:
-        print("✅ No control characters found.")
+        print(f"📦 Summary: all {len(resources)} resource file(s) passed.")
+    return status
+
+
+def error(message: str, status: int) -> None:
+    """Print *message* as an error and exit with *status*."""
+    print(f"Error: {message}", file=sys.stderr)
+    sys.exit(status)
+
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python diagnose_tsv.py path/to/file.tsv")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Check a TSV or CSV file, or every resource of a data package, "
+                                                 "for issues that might break Frictionless validation. Exits with "
+                                                 "0 if nothing was found, 1 if something was, 2 for bad arguments "
+                                                 "and 3 if an input could not be read.")
+    parser.add_argument("path", help="Path to the TSV or CSV file (optionally .gz, .bz2 or .xz, or a member of a zip archive "
+                                     "such as package.zip/event.tsv), or to a data package directory or zip archive "
+                                     "containing datapackage.json")
+    parser.add_argument("--schema", action="store_true",
+                        help="Also check the header and values against the DwC-DP table schema")
+    parser.add_argument("--table", help="Table schema name for a single file (default: the file name without extension)")
+    parser.add_argument("--schemas-dir", type=Path, default=DEFAULT_SCHEMAS_DIR,
+                        help="Directory of DwC-DP table schemas (default: dwc-dp/table-schemas in this repository)")
+    parser.add_argument("-j", "--jobs", type=int, default=default_jobs(),
+                        help="Number of worker processes (default: available CPU cores)")
+    parser.add_argument("--delimiter",
+                        help="Field delimiter of a single file; 'tab' or '\\t' for a tab "
+                             "(default: ',' for .csv files, tab otherwise)")
+    parser.add_argument("--quotechar", default='"',
+                        help="Quote character of a single file; an empty string disables quoting (default: '\"')")
+    parser.add_argument("--escapechar", help="Escape character of a single file (default: none)")
+    parser.add_argument("--fix", action="store_true",
+                        help="Also repair a single uncompressed file in place: remove the BOM, convert line endings "
+                             "to LF and remove or escape control characters")
+    parser.add_argument("--control", choices=["remove", "escape"], default="remove",
+                        help="With --fix, remove control characters or replace them with a \\xNN escape "
+                             "(default: remove)")
+    parser.add_argument("--format", choices=["text", "json", "ndjson"], default="text",
+                        help="Report format: text, a JSON document, or one JSON object per line for each finding "
+                             "and each file (default: text)")
+    parser.add_argument("--max-findings", type=int, default=DEFAULT_MAX_FINDINGS,
+                        help="With --format json or ndjson, number of findings recorded per rule and file; "
+                             f"counts are always exact (default: {DEFAULT_MAX_FINDINGS})")
+    args = parser.parse_args()
+    if args.max_findings < 0:
+        parser.error("--max-findings must not be negative")
+    report = None if args.format == 'text' else JsonReport(args.format, args.max_findings)
 
-    file_path = sys.argv[1]
-    if not os.path.isfile(file_path):
-        print(f"Error: File not found: {file_path}")
-        sys.exit(1)
+    path = Path(args.path)
+    if args.fix and not (path.is_file() and plain_file(path) and path.suffix.lower() != '.zip'):
+        error(f"--fix needs a single uncompressed file on disk: {path}", EXIT_USAGE)
 
-    print(f"🔍 Running diagnostics on: {file_path}\n")
-    check_bom(file_path)
-    check_line_lengths(file_path)
-    check_invisible_chars(file_path)
+    if path.is_dir() or (path.suffix.lower() == '.zip' and path.is_file()):
+        if path.is_dir():
+            package_dir = path if (path / PACKAGE_DESCRIPTOR).is_file() else None
+        else:
+            try:
+                package_dir = archive_package_dir(path)
+            except zipfile.BadZipFile as exc:
+                error(f"{exc}: {path}", EXIT_READ_ERROR)
+        if package_dir is None:
+            error(f"No {PACKAGE_DESCRIPTOR} found in: {path}", EXIT_READ_ERROR)
+        if report is not None:
+            report.package = str(package_dir)
+        try:
+            status = diagnose_package(package_dir, args.schemas_dir if args.schema else None, max(1, args.jobs), report)
+        except (*READ_ERRORS, json.JSONDecodeError) as exc:
+            error(f"Could not read {package_dir / PACKAGE_DESCRIPTOR}: {exc}", EXIT_READ_ERROR)
+        sys.exit(status)
+
+    file_path = args.path
+    if not os.path.isfile(file_path) and split_archive_path(file_path) is None:
+        error(f"File not found: {file_path}", EXIT_READ_ERROR)
+
+    delimiter = {'tab': '\t', '\\t': '\t'}.get(args.delimiter, args.delimiter)
+    try:
+        dialect = Dialect.for_file(file_path, delimiter, args.quotechar, args.escapechar)
+    except ValueError as exc:
+        error(str(exc), EXIT_USAGE)
+
+    schema = None
+    if args.schema:
+        table = args.table or Path(file_path).name.split('.')[0]
+        schema = load_table_schema(table, args.schemas_dir)
+        if schema is None:
+            error(f"No table schema '{table}' in {args.schemas_dir}", EXIT_USAGE)
+
+    if args.fix:
+        try:
+            status = fix_file(file_path, schema, dialect, args.control, report)
+        except READ_ERRORS as exc:
+            error(str(exc), EXIT_READ_ERROR)
+    else:
+        limit = None if report is None else report.max_findings
+        outcome = next(diagnose_files([(file_path, schema, dialect)], max(1, args.jobs), limit))
+        status = outcome_status(outcome)
+        if report is not None:
+            report.add(file_path, outcome)
+        elif isinstance(outcome, str):
+            error(outcome, status)
+        else:
+            report_file(file_path, outcome)
+    if report is not None:
+        report.close()
+    sys.exit(status)
 
 if __name__ == "__main__":
     main()
@@ -3,77 +3,682 @@
 # to CSV/TSV output having valid DwC property names
 # Assumes files to process have lowercased extension in {.csv, .tsv, .txt}
 #
-# Usage: python lsc_to_dwc_headers.py -i path_to_input_table_files -o path_to_ouput_table_files
+# Only the header record is parsed and rewritten; the rest of each file is copied
+# byte for byte in large blocks (with os.sendfile where available), so memory use
+# does not depend on the size of the file.
+#
+# Table schemas are looked up in a local table-schemas directory (by default dwc-dp/table-schemas
+# in this repository) or a released package archive first. Only tables not found there are
+# fetched from SCHEMA_BASE_URL, through an on-disk cache that is revalidated with ETag and
+# Last-Modified; with --offline the cache is used as it is and the network never.
+#
+# The local schemas are compiled into a header index (see HeaderIndex), kept in the cache
+# directory and rebuilt only when the schemas change. It also tells the table of a file
+# whose name is not the name of a table, local or fetched, from its header.
+#
+# With --jobs N, N files are normalized at a time in a thread pool (the copying runs
+# outside the GIL); each file's outcome is printed in file name order, followed by the
+# total throughput.
+#
+# With --reorder, the columns are also put in the order of the table schema's fields in
+# the same pass: missing optional fields are added as empty columns, and columns not in
+# the schema are kept after them, dropped, or moved to a quarantine file (--extra). Only
+# then is every row parsed; a file already in schema order is still copied as bytes.
+#
+# A file whose header is already normalized (and, with --reorder, in schema order) is
+# told from its header alone, and hard linked into the output folder rather than
+# rewritten (--unchanged). Every output file is written to a temporary file that then
+# replaces it, which also makes --in-place rewrites of the input files safe.
+#
+# Usage: python lsc_to_dwc_headers.py [--schemas dir|archive.zip] [--offline] [--jobs N] [--reorder [--extra drop|quarantine|keep]] [--unchanged link|copy|skip] -i path_to_input_table_files (-o path_to_ouput_table_files | --in-place)
 
 import os
+import re
+import io
 import csv
+import shutil
 import argparse
 import json
+import hashlib
+import tempfile
+import zipfile
+import urllib.error
+import time
+import threading
 import urllib.request
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
 
 SCHEMA_BASE_URL = "https://raw.githubusercontent.com/gbif/rs.gbif.org/master/sandbox/experimental/data-packages/dwc-dp/0.1/table-schemas"
 
+# Table schemas of this repository, used before anything is fetched
+DEFAULT_SCHEMAS_DIR = Path(__file__).resolve().parents[2] / "dwc-dp" / "table-schemas"
+
+# Fetched schemas are kept here along with their ETag and Last-Modified headers
+DEFAULT_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "dwc-dp" / "table-schemas"
+
+# Seconds to wait for the schema server before falling back to the cache
+FETCH_TIMEOUT = 10
+
+# Block size for copying the body of a file when os.sendfile cannot be used
+COPY_BUFSIZE = 16 * 1024 * 1024
+
+# Format of the serialised header index; a cached index of another version is rebuilt
+HEADER_INDEX_VERSION = 2
+
+# Share of a file's header names that must belong to a table for the header to identify it
+MIN_HEADER_MATCH = 0.5
+
+# Folder, within the output folder, of the columns that --extra quarantine takes out
+QUARANTINE_DIR = "quarantine"
+
 def normalize_fieldname(field):
     return field.lower().replace("-", "").replace("_", "")
 
-def fetch_model_schema(table_name):
-    url = f"{SCHEMA_BASE_URL}/{table_name}.json"
+class SchemaResolver:
+    # Resolves table schemas by name, each at most once per run: from schemas, a
+    # table-schemas directory or a zip archive of a release holding one (by default
+    # DEFAULT_SCHEMAS_DIR, if present), then from base_url through the cache in
+    # cache_dir (or the cache alone when offline).
+
+    def __init__(self, schemas=None, cache_dir=DEFAULT_CACHE_DIR, base_url=SCHEMA_BASE_URL,
+                 offline=False, timeout=FETCH_TIMEOUT):
+        if schemas is None and DEFAULT_SCHEMAS_DIR.is_dir():
+            schemas = DEFAULT_SCHEMAS_DIR
+        self.schemas = Path(schemas) if schemas else None
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.base_url = base_url.rstrip("/")
+        self.offline = offline
+        self.timeout = timeout
+        self.resolved = {}
+        self._archive = None
+        self._members = None
+        # Files are normalized in threads: a table is resolved by one of them at a time
+        self._lock = threading.Lock()
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def resolve(self, table_name):
+        with self._lock:
+            if table_name not in self.resolved:
+                schema = self.load_local(table_name)
+                if schema is None:
+                    schema = fetch_model_schema(table_name, self.base_url, self.cache_dir, self.offline, self.timeout)
+                self.resolved[table_name] = schema
+            return self.resolved[table_name]
+
+    def load_local(self, table_name):
+        if self.schemas is None:
+            return None
+        if self.schemas.is_dir():
+            path = self.schemas / f"{table_name}.json"
+            if not path.is_file():
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+
+        name = self._archive_members().get(f"{table_name}.json")
+        if name is None:
+            return None
+        with self._archive.open(name) as f:
+            return json.load(f)
+
+    def _archive_members(self):
+        # Schema file name -> archive member, for the members of a table-schemas folder
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self.schemas)
+            self._members = {}
+            for name in self._archive.namelist():
+                member = PurePosixPath(name)
+                if member.parent.name == "table-schemas" and member.suffix == ".json":
+                    self._members.setdefault(member.name, name)
+        return self._members
+
+    def local_tables(self):
+        # Names of all the local table schemas
+        if self.schemas is None:
+            return []
+        if self.schemas.is_dir():
+            return sorted(path.stem for path in self.schemas.glob("*.json"))
+        return sorted(PurePosixPath(name).stem for name in self._archive_members())
+
+    def local_signature(self):
+        # Digest of the names, sizes and modification times of the local schemas, which
+        # changes whenever one of them does; None if there are no local schemas
+        if self.schemas is None:
+            return None
+        if self.schemas.is_dir():
+            paths = sorted(self.schemas.glob("*.json"))
+        else:
+            paths = [self.schemas]
+        stats = [(path.name, path.stat().st_size, path.stat().st_mtime_ns) for path in paths]
+        return hashlib.sha256(json.dumps([HEADER_INDEX_VERSION, stats]).encode('utf-8')).hexdigest()
+
+def table_spec(schema):
+    # What normalization needs to know of a table schema: its fields in schema order
+    # with whether each is required, the mapping from normalized to canonical field
+    # name, and the fields of its primary key
+    fields = [
+        [field["name"], bool((field.get("constraints") or {}).get("required"))]
+        for field in schema.get("fields", [])
+    ]
+    primary_key = schema.get("primaryKey") or []
+    return {
+        "fields": fields,
+        "mapping": {normalize_fieldname(name): name for name, _ in fields},
+        "primary_key": [primary_key] if isinstance(primary_key, str) else primary_key,
+    }
+
+class HeaderIndex:
+    # Compiled from every local table schema: the table_spec() of each table, plus an
+    # inverted index from normalized field name to the tables that have it. The index
+    # is serialised as plain JSON, so loading it costs a single json.load.
+
+    def __init__(self, data):
+        self.signature = data["signature"]
+        self.tables = data["tables"]
+        self.inverted = data["inverted"]
+        self.table_names = data["table_names"]
+
+    @classmethod
+    def build(cls, resolver):
+        tables, inverted = {}, {}
+        for table_name in resolver.local_tables():
+            tables[table_name] = table_spec(resolver.load_local(table_name) or {})
+            for key in tables[table_name]["mapping"]:
+                inverted.setdefault(key, []).append(table_name)
+        return cls({
+            "signature": resolver.local_signature(),
+            "tables": tables,
+            "inverted": inverted,
+            "table_names": {normalize_fieldname(table_name): table_name for table_name in tables},
+        })
+
+    def to_json(self):
+        return json.dumps({
+            "version": HEADER_INDEX_VERSION,
+            "signature": self.signature,
+            "tables": self.tables,
+            "inverted": self.inverted,
+            "table_names": self.table_names,
+        })
+
+    def by_name(self, file_stem):
+        # Return the table of a file named file_stem, compared normalized so that e.g.
+        # Event_Assertion matches event-assertion, or None
+        return self.table_names.get(normalize_fieldname(file_stem))
+
+    def by_header(self, headers):
+        # Return the table of a file with these headers, as the table sharing the largest
+        # share of names with it (Jaccard similarity), provided at least MIN_HEADER_MATCH
+        # of the header names are its own, or None
+        keys = {normalize_fieldname(h) for h in headers} - {""}
+        matches = Counter(table_name for key in keys for table_name in self.inverted.get(key, ()))
+        if not matches:
+            return None
+
+        def similarity(table_name):
+            shared = matches[table_name]
+            return shared / (len(keys) + len(self.tables[table_name]["mapping"]) - shared), table_name
+
+        best = max(matches, key=similarity)
+        if matches[best] < MIN_HEADER_MATCH * len(keys):
+            return None
+        return best
+
+@contextmanager
+def replacing(path, mode="wb", permissions=None):
+    # Open a temporary file next to path for writing, and replace path with it in one
+    # step once it is complete, so that readers and concurrent runs never see a partial
+    # file. The temporary file is removed if writing fails. permissions, if given, are
+    # the mode bits of the new file.
+    directory, name = os.path.split(os.fspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory or ".", prefix=f".{name}.", suffix=".tmp")
     try:
-        with urllib.request.urlopen(url) as response:
-            return json.load(response)
-    except Exception as e:
-        print(f"Warning: Schema not found for '{table_name}' at URL: {url}")
+        if permissions is not None:
+            os.chmod(temp_path, permissions)
+        text = {} if "b" in mode else {"encoding": "utf-8", "newline": ""}
+        with open(fd, mode, **text) as f:
+            yield f
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def write_atomically(path, data):
+    # Replace path with data in one step, so that concurrent runs never read a partial file
+    with replacing(path) as f:
+        f.write(data)
+
+def load_header_index(resolver, cache_dir=None):
+    # Load the header index of the resolver's local schemas from cache_dir, or build it
+    # (and cache it) if it is missing or the schemas have changed since. None if there
+    # are no local schemas.
+    signature = resolver.local_signature()
+    if signature is None:
         return None
+    path = None
+    if cache_dir is not None:
+        source = hashlib.sha256(str(resolver.schemas.resolve()).encode('utf-8')).hexdigest()[:16]
+        path = cache_dir / f"header-index-{source}.json"
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == HEADER_INDEX_VERSION and data.get("signature") == signature:
+                return HeaderIndex(data)
+        except (OSError, ValueError, KeyError):
+            pass
 
-def normalize_csv_headers(input_path, output_path):
-    os.makedirs(output_path, exist_ok=True)
+    index = HeaderIndex.build(resolver)
+    if path is not None:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            write_atomically(path, index.to_json().encode('utf-8'))
+        except OSError as e:
+            print(f"Warning: Could not cache the header index in {cache_dir}: {e}")
+    return index
+
+def cache_paths(cache_dir, url):
+    # Cached body and metadata of url; the digest keeps the schemas of different base URLs apart
+    stem = f"{PurePosixPath(url).stem}-{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}"
+    return cache_dir / f"{stem}.json", cache_dir / f"{stem}.meta.json"
+
+def read_cache(cache_dir, url):
+    if cache_dir is None:
+        return None, {}
+    body_path, meta_path = cache_paths(cache_dir, url)
+    try:
+        with open(body_path, encoding='utf-8') as f:
+            schema = json.load(f)
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None, {}
+    return schema, meta
+
+def write_cache(cache_dir, url, body, headers):
+    if cache_dir is None:
+        return
+    meta = {"url": url, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for path, data in zip(cache_paths(cache_dir, url), (body, json.dumps(meta).encode('utf-8'))):
+            write_atomically(path, data)
+    except OSError as e:
+        print(f"Warning: Could not cache schema from {url}: {e}")
+
+def fetch_model_schema(table_name, base_url=SCHEMA_BASE_URL, cache_dir=None, offline=False, timeout=FETCH_TIMEOUT):
+    url = f"{base_url}/{table_name}.json"
+    cached, meta = read_cache(cache_dir, url)
+    if offline:
+        if cached is None:
+            print(f"Warning: Schema for '{table_name}' is neither local nor cached, and fetching is disabled (--offline)")
+        return cached
+
+    request = urllib.request.Request(url)
+    if cached is not None:
+        # Ask the server to answer 304 Not Modified if the cached copy is current
+        if meta.get("etag"):
+            request.add_header("If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            request.add_header("If-Modified-Since", meta["last_modified"])
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            schema = json.loads(body)
+            write_cache(cache_dir, url, body, response.headers)
+            return schema
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached is not None:
+            return cached
+        if e.code == 404 or cached is None:
+            print(f"Warning: Schema not found for '{table_name}' at URL: {url}")
+            return None
+        print(f"Warning: Could not fetch {url} ({e}); using the cached schema for '{table_name}'")
+        return cached
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        if cached is None:
+            print(f"Warning: Schema not found for '{table_name}' at URL: {url}")
+            return None
+        print(f"Warning: Could not fetch {url} ({e}); using the cached schema for '{table_name}'")
+        return cached
+
+def read_header(f, delimiter):
+    # Read the header record from binary file f, which may span several lines if a
+    # quoted name contains a newline. Returns the header names and the line terminator,
+    # leaving f positioned at the first byte after the header.
+    lines = []
+
+    def header_lines():
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            lines.append(line)
+            yield line.decode('utf-8-sig' if len(lines) == 1 else 'utf-8')
+
+    headers = next(csv.reader(header_lines(), delimiter=delimiter), None)
+    if headers is None:
+        return None, None
+    last = lines[-1]
+    terminator = '\r\n' if last.endswith(b'\r\n') else '\n' if last.endswith(b'\n') else ''
+    return headers, terminator
+
+def copy_rest(src, dst, offset):
+    # Copy binary file src from byte offset to its end onto binary file dst unchanged,
+    # inside the kernel with os.sendfile where it can copy between regular files
+    dst.flush()
+    size = os.fstat(src.fileno()).st_size
+    if hasattr(os, "sendfile"):
+        try:
+            while offset < size:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        except OSError:
+            # e.g. macOS, where sendfile only writes to sockets; carry on where it stopped
+            dst.seek(0, os.SEEK_END)
+    src.seek(offset)
+    shutil.copyfileobj(src, dst, COPY_BUFSIZE)
+
+def find_table(table_name, headers, index, resolver):
+    # Return the table of a file named after table_name and with these headers, its
+    # table_spec(), and how the table was found: from the header index by file "name",
+    # else from the "schema" named table_name, which may have to be fetched, and only
+    # failing that from the header index by "header", so that a file named after a
+    # table that is not local is not taken for another table that shares its fields.
+    # (None, None, None) if there is no schema.
+    if index is not None:
+        detected = index.by_name(table_name)
+        if detected is not None:
+            return detected, index.tables[detected], "name"
+
+    schema = resolver.resolve(table_name)
+    if schema:
+        return table_name, table_spec(schema), "schema"
+
+    if index is not None:
+        detected = index.by_header(headers)
+        if detected is not None:
+            return detected, index.tables[detected], "header"
+    return None, None, None
 
-    for filename in os.listdir(input_path):
-        input_file = os.path.join(input_path, filename)
+def plan_projection(headers, spec, extra):
+    # Plan the columns of a file with these (mapped) headers in schema order. Returns
+    # the output header, the index of the input column of each output column, where
+    # len(headers) stands for an empty column, and the indices of the input columns
+    # not in the schema. Columns not in the schema are appended unless extra is "drop"
+    # or "quarantine"; of duplicate columns, the first is the schema's.
+    width = len(headers)
+    position = {}
+    for i, name in enumerate(headers):
+        position.setdefault(name, i)
+    names = [name for name, _ in spec["fields"]]
+    indices = [position.get(name, width) for name in names]
+    used = set(indices)
+    extras = [i for i in range(width) if i not in used]
+    if extra == "keep":
+        names += [headers[i] for i in extras]
+        indices += extras
+    return names, indices, extras
 
-        # Skip directories and JSON files
-        if os.path.isdir(input_file) or filename.endswith(".json"):
-            continue
+def row_getter(indices):
+    # itemgetter returns a bare value, rather than a tuple, for a single index
+    if len(indices) == 1:
+        return lambda row, i=indices[0]: (row[i],)
+    return itemgetter(*indices)
 
-        if filename.lower().endswith((".csv", ".tsv", ".txt")):
-            table_name = os.path.splitext(filename)[0]
-            schema = fetch_model_schema(table_name)
-            if not schema:
-                print(f"Skipping {filename}, no schema available.")
-                continue
+def row_template(indices, width, delimiter):
+    # Compile the columns indices (see plan_projection) into a %-format template of a
+    # row in which the empty columns (index width) are already written out, and the
+    # getter of the values of the other columns
+    real = [i for i in indices if i != width]
+    template = delimiter.join("%s" if i != width else "" for i in indices)
+    return template, row_getter(real) if real else (lambda row: ())
 
-            output_file = os.path.join(output_path, filename)
-            delimiter = "," if filename.endswith(".csv") else "\t"
+def copy_projected(f, out, delimiter, terminator, width, indices, quarantine=None, quarantine_indices=()):
+    # Copy the rows of binary file f from its current position to text file out as
+    # columns indices (see plan_projection), and to text file quarantine, if given,
+    # as columns quarantine_indices. Rows without exactly width cells are padded or
+    # cut to width first. Returns the number of such rows.
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+    reader = csv.reader(text, delimiter=delimiter)
+    line_terminator = terminator or "\n"
+    needs_quoting = re.compile(f'[{re.escape(delimiter)}"\r\n]').search
+    outputs = [(out, indices)]
+    if quarantine is not None:
+        outputs.append((quarantine, quarantine_indices))
+    # Rows are formatted from a template, which is much faster than csv.writer on wide
+    # rows of mostly empty columns; csv.writer only writes the rows with a value that
+    # needs quoting, and rows of a single value
+    outputs = [
+        (output.write, *row_template(columns, width, delimiter), len(columns) > 1,
+         csv.writer(output, delimiter=delimiter, lineterminator=line_terminator).writerow, row_getter(columns))
+        for output, columns in outputs
+    ]
 
-            with open(input_file, newline='\n', encoding='utf-8') as f:
-                reader = csv.reader(f, delimiter=delimiter)
-                rows = list(reader)
+    ragged = 0
+    for row in reader:
+        if len(row) != width:
+            ragged += 1
+            row = row[:width] + [""] * (width - len(row))
+        for write, template, get, several, write_row, get_all in outputs:
+            values = get(row)
+            if several and needs_quoting("".join(values)) is None:
+                write(template % values + line_terminator)
+            else:
+                # Index width: the empty value of a column the file does not have
+                write_row(get_all(row + [""]))
+    # Leave f open for its owner
+    text.detach()
+    return ragged
 
-            if not rows:
-                print(f"Skipping empty file: {filename}")
-                continue
+def keep_unchanged(f, input_file, output_file, unchanged):
+    # Put the file at input_file, open as binary file f and already normalized, at
+    # output_file as unchanged says: as a hard link to it, a copy of it, or not at all.
+    # Returns the message about it.
+    filename = os.path.basename(input_file)
+    if os.path.exists(output_file) and os.path.samefile(input_file, output_file):
+        return f"Unchanged {filename}: headers already normalized"
+    if unchanged == "skip":
+        return f"Skipping {filename}, headers already normalized"
+    if unchanged == "link":
+        directory, name = os.path.split(output_file)
+        temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            os.link(input_file, temp_path)
+            os.replace(temp_path, output_file)
+            return f"Linked {filename}, headers already normalized -> {os.path.dirname(output_file)}"
+        except OSError:
+            # e.g. another file system, or one without hard links: copy it instead
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    with replacing(output_file, permissions=os.fstat(f.fileno()).st_mode & 0o777) as out:
+        copy_rest(f, out, 0)
+    return f"Copied {filename}, headers already normalized -> {os.path.dirname(output_file)}"
 
-            original_headers = rows[0]
-            normalized_headers = [normalize_fieldname(h) for h in original_headers]
+def normalize_file(filename, input_path, output_path, resolver, index, reorder=False, extra="keep",
+                   unchanged="link"):
+    # Normalize the headers of one file, and reorder its columns if asked to. Returns
+    # "written", "unchanged" (the file was normalized already) or "skipped", the
+    # messages to print about the file and the number of bytes read. output_path may
+    # be input_path, to normalize the file in place.
+    input_file = os.path.join(input_path, filename)
+    if not filename.lower().endswith((".csv", ".tsv", ".txt")):
+        return "skipped", [f"Skipping unsupported file: {filename}"], 0
 
-            # Build mapping from normalized to Darwin Core names
-            schema_fields = schema.get("fields", [])
-            dwc_mapping = {normalize_fieldname(field["name"]): field["name"] for field in schema_fields}
-            final_headers = [dwc_mapping.get(h, h) for h in normalized_headers]
+    messages = []
+    table_name = os.path.splitext(filename)[0]
+    output_file = os.path.join(output_path, filename)
+    delimiter = "," if filename.endswith(".csv") else "\t"
 
-            with open(output_file, "w", newline='\n', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=delimiter, lineterminator='\n')
-                writer.writerow(final_headers)
-                writer.writerows(rows[1:])
+    with open(input_file, "rb") as f:
+        stat = os.fstat(f.fileno())
+        size, permissions = stat.st_size, stat.st_mode & 0o777
+        original_headers, terminator = read_header(f, delimiter)
 
-            print(f"Normalized and mapped headers in {filename} -> {output_path}")
+        if original_headers is None:
+            return "skipped", [f"Skipping empty file: {filename}"], 0
+        header_size = f.tell()
+
+        # Mapping from normalized to Darwin Core names
+        detected, spec, how = find_table(table_name, original_headers, index, resolver)
+        if spec is None:
+            return "skipped", [f"Skipping {filename}, no schema available."], header_size
+        if how == "header":
+            messages.append(f"Detected table '{detected}' for {filename} from its header")
+
+        dwc_mapping = spec["mapping"]
+        normalized_headers = [normalize_fieldname(h) for h in original_headers]
+        mapped_headers = final_headers = [dwc_mapping.get(h, h) for h in normalized_headers]
+
+        width = len(final_headers)
+        indices = list(range(width))
+        extras = []
+        if reorder:
+            missing = [name for name, required in spec["fields"] if required and name not in final_headers]
+            if missing:
+                return "skipped", [f"Skipping {filename}, required columns missing: {missing}"], header_size
+            final_headers, indices, extras = plan_projection(final_headers, spec, extra)
+            filled = [name for name, i in zip(final_headers, indices) if i == width]
+            if filled:
+                messages.append(f"Added {len(filled)} empty column(s) to {filename} for the optional fields it lacks")
+            if extras:
+                moved = {"keep": "Kept", "drop": "Dropped", "quarantine": "Quarantined"}[extra]
+                messages.append(f"{moved} columns of {filename} not in the '{detected}' schema: "
+                                f"{[original_headers[i] for i in extras]}")
+
+        if indices == list(range(width)):
+            # Nothing to reorder: only the header changes, if it does at all
+            header = io.StringIO()
+            csv.writer(header, delimiter=delimiter, lineterminator=terminator).writerow(final_headers)
+            header = header.getvalue().encode('utf-8')
+            f.seek(0)
+            if f.read(header_size) == header:
+                messages.append(keep_unchanged(f, input_file, output_file, unchanged))
+                return "unchanged", messages, header_size
+            with replacing(output_file, permissions=permissions) as out:
+                out.write(header)
+                copy_rest(f, out, header_size)
         else:
-            print(f"Skipping unsupported file: {filename}")
+            with ExitStack() as stack:
+                line_terminator = terminator or "\n"
+                out = stack.enter_context(replacing(output_file, "w", permissions))
+                csv.writer(out, delimiter=delimiter, lineterminator=line_terminator).writerow(final_headers)
+
+                quarantine, quarantine_indices = None, []
+                if extra == "quarantine" and extras:
+                    # Rows keep their order, and the primary key if the file has it, to be joined back
+                    key = [mapped_headers.index(name) for name in spec["primary_key"] if name in mapped_headers]
+                    quarantine_indices = key + extras
+                    os.makedirs(os.path.join(output_path, QUARANTINE_DIR), exist_ok=True)
+                    quarantine = stack.enter_context(replacing(os.path.join(output_path, QUARANTINE_DIR, filename),
+                                                               "w", permissions))
+                    csv.writer(quarantine, delimiter=delimiter, lineterminator=line_terminator).writerow(
+                        [original_headers[i] for i in quarantine_indices])
+
+                ragged = copy_projected(f, out, delimiter, terminator, width, indices, quarantine, quarantine_indices)
+            if ragged:
+                messages.append(f"Padded or cut {ragged} row(s) of {filename} to the {width} columns of its header")
+
+    messages.append(f"Normalized and mapped headers in {filename} -> {output_path}")
+    return "written", messages, size
+
+def format_rate(size, seconds):
+    return f"{size / 1e6:.1f} MB in {seconds:.2f} s ({size / 1e6 / max(seconds, 1e-6):.1f} MB/s)"
+
+def normalize_csv_headers(input_path, output_path=None, resolver=None, index=None, jobs=1, reorder=False, extra="keep",
+                          unchanged="link"):
+    # Without output_path, the files are normalized in place
+    if resolver is None:
+        resolver = SchemaResolver()
+        index = load_header_index(resolver)
+    if output_path is None:
+        output_path = input_path
+    os.makedirs(output_path, exist_ok=True)
+
+    # Skip directories, JSON files and the temporary files of interrupted runs
+    filenames = sorted(
+        filename for filename in os.listdir(input_path)
+        if not os.path.isdir(os.path.join(input_path, filename)) and not filename.endswith((".json", ".tmp"))
+    )
+
+    def run(filename):
+        started = time.perf_counter()
+        try:
+            status, messages, size = normalize_file(filename, input_path, output_path, resolver, index,
+                                                    reorder, extra, unchanged)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            # One unreadable file does not stop the rest of the batch
+            status, messages, size = "skipped", [f"Skipping {filename}: {e}"], 0
+        return status, messages, size, time.perf_counter() - started
+
+    started = time.perf_counter()
+    counts, total_size = Counter(), 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        # Results come back in file name order, whatever order the files finish in
+        for status, messages, size, seconds in executor.map(run, filenames):
+            if status == "written":
+                messages[-1] += f" [{format_rate(size, seconds)}]"
+                total_size += size
+            counts[status] += 1
+            for message in messages:
+                print(message)
+    elapsed = time.perf_counter() - started
+
+    print(f"Normalized {counts['written']} of {len(filenames)} file(s), {counts['unchanged']} already normalized: "
+          f"{format_rate(total_size, elapsed)} with {max(1, jobs)} worker(s)")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Normalize headers of CSV/TSV files to match Darwin Core names via schema lookup")
     parser.add_argument("-i", "--input", required=True, help="Path to folder containing input CSV/TSV files")
-    parser.add_argument("-o", "--output", required=True, help="Path to folder for writing normalized output")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("-o", "--output", help="Path to folder for writing normalized output")
+    output.add_argument("--in-place", action="store_true",
+                        help="Rewrite the input files themselves, each through a temporary file that replaces it")
+    parser.add_argument("--schemas", type=Path,
+                        help="Table schemas directory, or zip archive of a release with a table-schemas folder, "
+                             "to look schemas up in before fetching them (default: dwc-dp/table-schemas in this "
+                             "repository, if present)")
+    parser.add_argument("--schema-url", default=SCHEMA_BASE_URL,
+                        help="Base URL to fetch table schemas not found locally from")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, type=Path,
+                        help=f"Directory caching fetched schemas (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the schema cache")
+    parser.add_argument("--offline", action="store_true",
+                        help="Never fetch schemas: use only local and cached ones")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of files to normalize at a time (default: number of CPUs)")
+    parser.add_argument("--reorder", action="store_true",
+                        help="Also put the columns in the order of the table schema's fields, adding missing "
+                             "optional fields as empty columns")
+    parser.add_argument("--extra", choices=["keep", "drop", "quarantine"], default="keep",
+                        help=f"With --reorder, keep columns not in the schema after the schema's, drop them, or move "
+                             f"them, with the primary key, to {QUARANTINE_DIR}/ in the output folder (default: keep)")
+    parser.add_argument("--unchanged", choices=["link", "copy", "skip"], default="link",
+                        help="What to put in the output folder for a file whose headers are already normalized: a "
+                             "hard link to it (or a copy, where linking is not possible), a copy, or nothing "
+                             "(default: link)")
+    parser.add_argument("--timeout", type=float, default=FETCH_TIMEOUT,
+                        help=f"Seconds to wait for the schema server (default: {FETCH_TIMEOUT})")
 
     args = parser.parse_args()
-    normalize_csv_headers(args.input, args.output)
+    if args.schemas is not None and not args.schemas.is_dir() and not zipfile.is_zipfile(args.schemas):
+        parser.error(f"Not a table schemas directory or zip archive: {args.schemas}")
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    resolver = SchemaResolver(args.schemas, cache_dir, args.schema_url, args.offline, args.timeout)
+    try:
+        index = load_header_index(resolver, cache_dir)
+        normalize_csv_headers(args.input, args.output, resolver, index, args.jobs, args.reorder, args.extra,
+                              args.unchanged)
+    finally:
+        resolver.close()
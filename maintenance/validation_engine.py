@@ -0,0 +1,1213 @@
+#
+# Validation engine shared by the data packages validation scripts
+# (data-packages-validation-checks-local.py, its copy in sql/ and
+# data-packages-validation-checks-sandbox.py). The scripts are thin
+# configurations of it: the directories to scan and the passes to run
+# (see standard_passes).
+#
+# Each pass declares the values it needs (e.g. the parsed index.json, the
+# loaded table schemas) and the value it provides. The engine starts a pass
+# as soon as its inputs are available, in a thread pool shared by all
+# packages, so passes that do not depend on each other run concurrently:
+# once the schemas are loaded, the Frictionless descriptor checks and the
+# foreign key checks run side by side, and the URL checks run alongside
+# everything. A pass whose input could not be provided is skipped.
+#
+# Every index.json and table schema file is parsed once per run. Messages
+# are printed per package in the order of its passes, and packages in
+# sorted order, whatever order the passes finished in.
+#
+# With a manifest (see Manifest), a run re-checks only the schemas whose
+# content, or index.json entry, changed since the run that wrote it, plus
+# the schemas that reach them through foreignKeys or weakForeignKeys; the
+# messages of the other schemas are those recorded for them last time.
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from importlib.metadata import version
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlparse
+
+# Field-level properties that must be present on every field in every schema
+REQUIRED_FIELD_PROPERTIES = ['description', 'type']
+
+# Properties that must match between an index.json tableSchemas entry and
+# the corresponding table schema file
+CROSS_CHECK_PROPERTIES = ['url', 'identifier', 'name', 'title']
+
+# URL reachability checks: seconds to wait for a response, URLs checked at a
+# time, and requests in flight at a time to any one host
+URL_TIMEOUT          = 5
+URL_CONCURRENCY      = 16
+URL_HOST_CONCURRENCY = 4
+
+# Outcomes of URL checks kept between runs: reachable URLs checked less than
+# URL_CACHE_TTL seconds ago are not requested again, older ones are
+# revalidated with a conditional request
+URL_CACHE_FILE = (Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+                  / 'dwc-dp' / 'url-checks.json')
+URL_CACHE_TTL  = 24 * 60 * 60
+
+# Per-schema content hashes and messages of the last run, for incremental
+# runs; bump MANIFEST_VERSION whenever a check changes what it reports
+MANIFEST_FILE    = URL_CACHE_FILE.parent / 'validation-manifest.json'
+MANIFEST_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# Validation result collector
+# ---------------------------------------------------------------------------
+
+class ValidationResult:
+    """
+    Accumulates errors and warnings across all validation passes.
+
+    With echo, messages are printed as they are recorded; without, they are
+    kept, as (level, message) pairs, until merged into another result, so
+    that concurrent passes do not interleave their output.
+    """
+
+    def __init__(self, echo: bool = True):
+        self.echo = echo
+        self.errors: list[str] = []
+        self.warnings: list[str] = []
+        self.messages: list[tuple[str, str]] = []
+
+    def record(self, level: str, msg: str) -> None:
+        """Record *msg* as 'info', 'warning' or 'error'."""
+        if level == 'error':
+            self.errors.append(msg)
+            line = f"Error: {msg}"
+        elif level == 'warning':
+            self.warnings.append(msg)
+            line = f"Warning: {msg}"
+        else:
+            line = msg
+        if self.echo:
+            print(line)
+        else:
+            self.messages.append((level, msg))
+
+    def info(self, msg: str) -> None:
+        self.record('info', msg)
+
+    def error(self, msg: str) -> None:
+        self.record('error', msg)
+
+    def warning(self, msg: str) -> None:
+        self.record('warning', msg)
+
+    def replay(self, messages: list) -> None:
+        """Record (level, message) pairs, e.g. those of another result."""
+        for level, msg in messages:
+            self.record(level, msg)
+
+    def merge(self, other: 'ValidationResult') -> None:
+        """Record the messages, errors and warnings of *other* after our own."""
+        self.replay(other.messages)
+
+    @property
+    def has_errors(self) -> bool:
+        return bool(self.errors)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def load_json(file_path: Path, result: ValidationResult) -> dict | None:
+    """
+    Load and return parsed JSON from *file_path*.
+    Records an error and returns None on parse failure or missing file.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        result.error(f"File not found: {file_path}")
+    except json.JSONDecodeError as exc:
+        result.error(f"Invalid JSON in {file_path}: {exc}")
+    return None
+
+
+def write_json_atomically(path: Path, data) -> None:
+    """Replace *path* with *data* as JSON in one step, creating its directory."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class Documents:
+    """
+    The JSON files of a run, each parsed at most once, whoever asks first.
+    Errors in a file are recorded in the result of every load of it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parsed: dict[Path, tuple[dict | None, list]] = {}
+
+    def load(self, file_path: Path, result: ValidationResult) -> dict | None:
+        key = file_path.resolve()
+        with self.lock:
+            if key not in self.parsed:
+                errors = ValidationResult(echo=False)
+                self.parsed[key] = load_json(file_path, errors), errors.messages
+            data, messages = self.parsed[key]
+        result.replay(messages)
+        return data
+
+
+def schemas_dir(package_file: Path) -> Path:
+    """Return the table-schemas directory for a given index.json path."""
+    return package_file.parent / 'table-schemas'
+
+
+def find_package_files(directories: list[str], descriptor: str = 'index.json') -> list[Path]:
+    """Recursively find all *descriptor* package files under each directory."""
+    package_files = []
+    for base_dir in directories:
+        for root, _, files in os.walk(base_dir):
+            if descriptor in files:
+                package_files.append(Path(root) / descriptor)
+    return package_files
+
+
+# ---------------------------------------------------------------------------
+# Validation passes
+# ---------------------------------------------------------------------------
+
+def load_package(package_file: Path, documents: Documents, result: ValidationResult) -> dict | None:
+    """Return the parsed package descriptor *package_file*, or None if it is unreadable."""
+    return documents.load(package_file, result)
+
+
+class HostLimiter:
+    """
+    Limits the requests made to each host: at most *concurrency* in flight at
+    a time and, if *rate* is given, at most *rate* started per second.
+    """
+
+    def __init__(self, concurrency: int, rate: float | None = None):
+        self.concurrency = concurrency
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self.next_start: dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, host: str):
+        """Wait for this host's turn, and hold a slot for the duration of the block."""
+        with self.lock:
+            semaphore = self.semaphores.setdefault(
+                host, threading.BoundedSemaphore(self.concurrency)
+            )
+        with semaphore:
+            if self.interval:
+                with self.lock:
+                    now = time.monotonic()
+                    start = max(now, self.next_start.get(host, now))
+                    self.next_start[host] = start + self.interval
+                time.sleep(start - now)
+            yield
+
+
+@functools.lru_cache(maxsize=None)
+def local_fallback(url: str) -> tuple[str, bool]:
+    """
+    Return the local path standing in for *url* (its path component) and
+    whether a file exists there.
+    """
+    local_path = urlparse(url).path.lstrip('/')
+    return local_path, os.path.exists(local_path)
+
+
+class UrlCache:
+    """
+    On-disk record of URL checks: url -> {status, etag, last_modified,
+    checked_at}. Only HTTP responses are recorded, never network errors.
+    """
+
+    def __init__(self, path: Path | None, ttl: float = URL_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict] = {}
+        self.changed = False
+        if path is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as exc:
+                print(f"Warning: Ignoring unreadable URL cache {path}: {exc}")
+
+    def get(self, url: str) -> dict | None:
+        with self.lock:
+            return self.entries.get(url)
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Whether *entry* is a reachable URL checked less than ttl seconds ago."""
+        return entry['status'] < 400 and time.time() - entry['checked_at'] < self.ttl
+
+    def put(self, url: str, status: int, etag: str | None, last_modified: str | None) -> None:
+        with self.lock:
+            self.entries[url] = {
+                'status': status,
+                'etag': etag,
+                'last_modified': last_modified,
+                'checked_at': time.time(),
+            }
+            self.changed = True
+
+    def save(self) -> None:
+        """Write the entries back, in one step, if any changed."""
+        if self.path is None or not self.changed:
+            return
+        try:
+            write_json_atomically(self.path, self.entries)
+        except OSError as exc:
+            print(f"Warning: Could not write URL cache {self.path}: {exc}")
+
+
+class UrlChecker:
+    """
+    Checks URLs for reachability concurrently through one pooled HTTP session.
+
+    Each URL is requested at most once per checker; later checks of the same
+    URL (e.g. from another package) reuse the first outcome, or wait for it
+    if it is still being checked. The requests of all the callers share one
+    pool of *concurrency* threads, so that packages checked side by side do
+    not add up to more. With a cache,
+    URLs found reachable within its ttl are not requested at all, and others
+    it knows are revalidated with If-None-Match / If-Modified-Since.
+
+    *url_map* maps URL prefixes to local directories; a URL under one of the
+    prefixes is reachable if the rest of it names an existing path in that
+    directory, and is never requested.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = URL_CONCURRENCY,
+        host_concurrency: int = URL_HOST_CONCURRENCY,
+        rate: float | None = None,
+        timeout: float = URL_TIMEOUT,
+        cache: UrlCache | None = None,
+        url_map: list[tuple[str, Path]] | None = None,
+    ):
+        # Longest prefix first, so that the most specific mapping wins
+        self.url_map = sorted(url_map or [], key=lambda item: len(item[0]), reverse=True)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.limiter = HostLimiter(max(1, host_concurrency), rate)
+        self.cache = cache if cache is not None else UrlCache(None)
+        # Imported only here, so that the validators that check no URLs do not need requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        # One pooled connection per concurrent request, reused across URLs of a host
+        adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='url-check')
+        # url -> the future error, or None, of its check; callers check() in threads
+        self.lock = threading.Lock()
+        self.outcomes: dict[str, Future] = {}
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        self.session.close()
+        self.cache.save()
+
+    def map_url(self, url: str) -> Path | None:
+        """Return the local path of *url* under a mapped prefix, or None."""
+        for prefix, directory in self.url_map:
+            if url.startswith(prefix):
+                return directory / url[len(prefix):].lstrip('/')
+        return None
+
+    def resolve_mapped(self, url: str, local_path: Path) -> str | None:
+        """Return the error for *url*, mapped to *local_path*, or None if it exists."""
+        if not local_path.exists():
+            return f"No local file for mapped URL: {url} (checked local path: {str(local_path)!r})"
+        return None
+
+    def head(self, url: str) -> int:
+        """Return the HTTP status of *url*, revalidating what the cache knows of it."""
+        cached = self.cache.get(url)
+        if cached is not None and self.cache.is_fresh(cached):
+            return cached['status']
+
+        headers = {}
+        if cached is not None and cached['status'] < 400:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        with self.limiter.slot(urlparse(url).netloc):
+            response = self.session.head(url, allow_redirects=True, timeout=self.timeout,
+                                         headers=headers)
+        if response.status_code == 304 and cached is not None:
+            # Unchanged since the last check: still reachable
+            self.cache.put(url, cached['status'], cached.get('etag'), cached.get('last_modified'))
+            return cached['status']
+        self.cache.put(url, response.status_code, response.headers.get('ETag'),
+                       response.headers.get('Last-Modified'))
+        return response.status_code
+
+    def resolve_url(self, url: str) -> str | None:
+        """Return the error for *url*, or None if it is reachable."""
+        import requests
+        try:
+            if self.head(url) >= 400:
+                # Fallback: check whether the URL's path exists as a local file.
+                # This handles any domain, not just rs.gbif.org.
+                local_path, exists = local_fallback(url)
+                if not exists:
+                    return (f"Unreachable URL and no local file found: {url} "
+                            f"(checked local path: {local_path!r})")
+        except requests.RequestException as exc:
+            return f"Network error resolving URL {url}: {exc}"
+        return None
+
+    def check(self, urls: list[str]) -> dict[str, str | None]:
+        """
+        Return the error, or None, for each of *urls*, requesting those not
+        checked before concurrently in the checker's pool, and waiting for
+        those that another caller is checking.
+        """
+        with self.lock:
+            for url in dict.fromkeys(urls):
+                if url in self.outcomes:
+                    continue
+                local_path = self.map_url(url)
+                if local_path is not None:
+                    future = Future()
+                    future.set_result(self.resolve_mapped(url, local_path))
+                else:
+                    future = self.executor.submit(self.resolve_url, url)
+                self.outcomes[url] = future
+            futures = {url: self.outcomes[url] for url in urls}
+        return {url: future.result() for url, future in futures.items()}
+
+
+def find_urls(data) -> list[str]:
+    """Return every 'url' value in *data*, recursively, in document order."""
+    urls = []
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == 'url' and isinstance(value, str):
+                urls.append(value)
+            elif isinstance(value, (dict, list)):
+                urls.extend(find_urls(value))
+    elif isinstance(data, list):
+        for item in data:
+            urls.extend(find_urls(item))
+    return urls
+
+
+def check_urls_are_resolvable(
+    package_data: dict,
+    result: ValidationResult,
+    checker: UrlChecker | None = None,
+) -> None:
+    """
+    Recursively find every 'url' value in the package data and verify it is
+    reachable via HTTP HEAD.
+
+    If a URL returns a 4xx response, the URL's path component is checked as a
+    local file path. This supports new declarations that have been committed
+    locally but not yet published to the remote server.
+
+    Non-HTTP errors (network failures, timeouts) are always reported as errors.
+
+    Each distinct URL is checked once, concurrently with the others, and
+    reported in the order in which it first appears in the package data.
+    """
+    own_checker = checker is None
+    if own_checker:
+        checker = UrlChecker()
+    try:
+        urls = list(dict.fromkeys(find_urls(package_data)))
+        for url, error in checker.check(urls).items():
+            if error is not None:
+                result.error(error)
+    finally:
+        if own_checker:
+            checker.close()
+
+
+def check_index_json(
+    package_file: Path,
+    package_data: dict,
+    result: ValidationResult,
+    strict: bool = False,
+) -> list[str]:
+    """
+    Verify tableSchemas entries in index.json for:
+      - Presence of required keys (identifier, name, title, url)
+      - Uniqueness of identifier, name, and title across all entries
+      - Consistency between declared urls and files present on disk
+
+    With *strict*, also for:
+      - Warning on missing description
+      - Uniqueness of url
+
+    Returns the list of declared schema basenames for use by later passes.
+    """
+    result.info(f"Checking index: {package_file}")
+
+    table_schemas_path = schemas_dir(package_file)
+    if not table_schemas_path.exists():
+        result.error(f"Table schemas directory missing: {table_schemas_path}")
+        return []
+
+    declared_basenames: list[str] = []
+    seen: dict[str, set] = {
+        'identifier': set(),
+        'name': set(),
+        'title': set(),
+        'url': set(),
+    }
+
+    for entry in package_data.get('tableSchemas', []):
+        # Required unique keys
+        for key in ('identifier', 'name', 'title'):
+            value = entry.get(key)
+            if value is None:
+                result.error(f"Missing '{key}' in tableSchemas entry: {entry}")
+            elif value in seen[key]:
+                result.error(f"Duplicate '{key}' value '{value}' in tableSchemas")
+            else:
+                seen[key].add(value)
+
+        # description: optional, warn if absent (not checked for uniqueness)
+        if strict and 'description' not in entry:
+            result.warning(f"Missing 'description' in tableSchemas entry for "
+                           f"'{entry.get('name', '<unknown>')}'")
+
+        # url: required, and unique if strict
+        url = entry.get('url')
+        if url is None:
+            result.error(f"Missing 'url' in tableSchemas entry: {entry}")
+        elif strict and url in seen['url']:
+            result.error(f"Duplicate 'url' value '{url}' in tableSchemas")
+        else:
+            seen['url'].add(url)
+            declared_basenames.append(Path(url).name)
+
+    actual_basenames = {f.name for f in table_schemas_path.glob('*.json')}
+    declared_set = set(declared_basenames)
+
+    for missing in sorted(declared_set - actual_basenames):
+        result.error(f"Declared schema file not found on disk: {missing}")
+    for extra in sorted(actual_basenames - declared_set):
+        result.warning(f"Schema file on disk not declared in index.json: {extra}")
+
+    return declared_basenames
+
+
+def declared_schemas(
+    package_file: Path,
+    package_data: dict,
+    result: ValidationResult,
+    strict: bool = False,
+) -> list[str] | None:
+    """
+    check_index_json as a pass: None rather than an empty list when nothing
+    is declared, so that the passes after it are skipped.
+    """
+    return check_index_json(package_file, package_data, result, strict) or None
+
+
+def check_schema_json(
+    package_file: Path,
+    package_data: dict,
+    declared_basenames: list[str],
+    documents: Documents,
+    result: ValidationResult,
+    cross_check_properties: list[str] = (),
+) -> dict[str, dict]:
+    """
+    For each declared schema file:
+      - Verify it is valid JSON
+      - Cross-check *cross_check_properties* (e.g. url, identifier, name,
+        and title) against the index.json entry
+      - Verify each field carries the required metadata properties
+
+    Returns a dict mapping schema name → parsed schema dict for valid files,
+    so later passes can reuse the already-loaded data without re-reading files.
+    """
+    # Build a lookup from basename → index.json entry for cross-checking
+    index_entries: dict[str, dict] = {
+        Path(entry['url']).stem: entry
+        for entry in package_data.get('tableSchemas', [])
+        if 'url' in entry
+    }
+
+    loaded: dict[str, dict] = {}
+
+    for basename in declared_basenames:
+        file_path = schemas_dir(package_file) / basename
+        data = documents.load(file_path, result)
+        if data is None:
+            # load_json already recorded the error; skip further checks
+            continue
+
+        schema_name = file_path.stem
+        loaded[schema_name] = data
+
+        # Cross-check properties between index.json entry and schema file
+        index_entry = index_entries.get(schema_name)
+        if index_entry is None:
+            # Already reported as a missing declaration; nothing more to do
+            continue
+
+        for prop in cross_check_properties:
+            declared_val = index_entry.get(prop)
+            actual_val = data.get(prop)
+            if declared_val != actual_val:
+                result.error(
+                    f"'{prop}' mismatch for schema '{schema_name}': "
+                    f"index.json has {declared_val!r}, "
+                    f"schema file has {actual_val!r}"
+                )
+
+        # Field-level metadata
+        for field in data.get('fields', []):
+            field_name = field.get('name', '<unnamed>')
+            for prop in REQUIRED_FIELD_PROPERTIES:
+                if prop not in field:
+                    result.error(
+                        f"Field '{field_name}' in '{basename}' "
+                        f"is missing required property '{prop}'"
+                    )
+
+    return loaded
+
+
+def check_frictionless_schema(name: str, descriptor: dict, result: ValidationResult) -> bool:
+    """Validate one schema descriptor; return whether it is valid."""
+    # Imported on first use: it takes longer to import than an incremental run
+    # with no changed schemas takes to complete
+    from frictionless import Schema
+
+    try:
+        Schema.from_descriptor(descriptor)
+        return True
+    except Exception as exc:
+        result.error(f"Frictionless validation failed for '{name}': {exc}")
+        return False
+
+
+def check_foreign_keys(
+    loaded_schemas: dict[str, dict],
+    result: ValidationResult,
+    only: set[str] | None = None,
+) -> None:
+    """
+    For every foreignKey in every table schema (or in those named in *only*),
+    verify:
+      - All source fields exist in the declaring schema
+      - The target schema exists (empty/missing resource = self-reference)
+      - All target fields exist in the referenced schema
+      - The target field is the primary key of the referenced schema
+
+    Supports composite keys (fields as a list) and self-referential FKs.
+    Self-referential FKs additionally require the declaring schema to have
+    a primaryKey defined.
+    """
+
+    def as_list(value) -> list:
+        if isinstance(value, list):
+            return value
+        return [value] if value is not None else []
+
+    for schema_name, schema_data in loaded_schemas.items():
+        if only is not None and schema_name not in only:
+            continue
+        source_field_names = {
+            fld.get('name')
+            for fld in schema_data.get('fields', [])
+            if isinstance(fld, dict) and 'name' in fld
+        }
+
+        for fk in schema_data.get('foreignKeys', []):
+            fk_fields = as_list(fk.get('fields'))
+            ref = fk.get('reference') or {}
+            tgt_resource = (ref.get('resource') or '').strip() or None
+            tgt_fields = as_list(ref.get('fields'))
+
+            # Check all source fields exist
+            missing_src = [f for f in fk_fields if f not in source_field_names]
+            if missing_src:
+                result.error(
+                    f"Foreign key in '{schema_name}' references non-existent "
+                    f"source field(s): {missing_src}"
+                )
+                continue
+
+            # Self-referential FK (resource is empty/missing)
+            if tgt_resource is None:
+                pk = as_list(schema_data.get('primaryKey'))
+                if not pk:
+                    result.error(
+                        f"Self-referential FK in '{schema_name}' "
+                        f"requires a primaryKey in the same schema"
+                    )
+                elif set(tgt_fields) != set(pk):
+                    result.error(
+                        f"Self-referential FK in '{schema_name}' must reference "
+                        f"the primaryKey {pk}, but references {tgt_fields}"
+                    )
+                continue
+
+            # FK referencing another schema
+            if tgt_resource not in loaded_schemas:
+                result.error(
+                    f"Foreign key {schema_name}/{fk_fields} references "
+                    f"non-existent target schema '{tgt_resource}'"
+                )
+                continue
+
+            ref_schema = loaded_schemas[tgt_resource]
+            ref_field_names = {
+                fld.get('name')
+                for fld in ref_schema.get('fields', [])
+                if isinstance(fld, dict) and 'name' in fld
+            }
+
+            missing_tgt = [f for f in tgt_fields if f not in ref_field_names]
+            if missing_tgt:
+                result.error(
+                    f"Foreign key {schema_name}/{fk_fields} references "
+                    f"non-existent field(s) in '{tgt_resource}': {missing_tgt}"
+                )
+                continue
+
+            # Verify target fields are the primary key of the referenced schema
+            tgt_pk = as_list(ref_schema.get('primaryKey'))
+            if tgt_pk and set(tgt_fields) != set(tgt_pk):
+                result.error(
+                    f"Foreign key {schema_name}/{fk_fields} targets "
+                    f"'{tgt_resource}/{tgt_fields}' which is not the primary key "
+                    f"(primaryKey={tgt_pk})"
+                )
+
+
+# ---------------------------------------------------------------------------
+# Incremental validation
+# ---------------------------------------------------------------------------
+
+class Manifest:
+    """
+    On-disk record of the last check of each schema of each package: the
+    hash of its content and index.json entry, the schemas it references, and
+    the messages of each per-schema pass. Packages are keyed by their path
+    and the configuration of the checks.
+    """
+
+    def __init__(self, path: Path | None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.packages: dict[str, dict] = {}
+        self.changed = False
+        if path is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.packages = data['packages']
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError, AttributeError) as exc:
+                print(f"Warning: Ignoring unreadable manifest {path}: {exc}")
+
+    def get(self, key: str) -> dict[str, dict]:
+        with self.lock:
+            return self.packages.get(key, {})
+
+    def put(self, key: str, schemas: dict[str, dict]) -> None:
+        with self.lock:
+            self.packages[key] = schemas
+            self.changed = True
+
+    def save(self) -> None:
+        """Write the manifest back, in one step, if any package changed."""
+        if self.path is None or not self.changed:
+            return
+        try:
+            write_json_atomically(self.path, {'version': MANIFEST_VERSION, 'packages': self.packages})
+        except OSError as exc:
+            print(f"Warning: Could not write manifest {self.path}: {exc}")
+
+
+class Plan:
+    """
+    What to check of one package: the names of the schemas to check again
+    (*stale*), the manifest's records of the others (*previous*), and the
+    records of this run, per pass and schema name.
+    """
+
+    CHECKS = ('schemas', 'frictionless', 'foreign_keys')
+
+    def __init__(
+        self,
+        key: str,
+        hashes: dict[str, str],
+        targets: dict[str, list[str]],
+        previous: dict[str, dict],
+        stale: set[str],
+    ):
+        self.key = key
+        self.hashes = hashes
+        self.targets = targets
+        self.previous = previous
+        self.stale = stale
+        self.records: dict[str, dict] = {check: {} for check in self.CHECKS}
+
+    def cached(self, check: str, name: str):
+        """Return the last run's record of *check* for schema *name*, unless it is stale."""
+        if name in self.stale:
+            return None
+        return self.previous.get(name, {}).get(check)
+
+    def entries(self) -> dict[str, dict]:
+        """The manifest entries of the package's schemas after this run."""
+        entries = {}
+        for name, digest in self.hashes.items():
+            entry = {'hash': digest, 'targets': self.targets[name]}
+            for check in self.CHECKS:
+                if name in self.records[check]:
+                    entry[check] = self.records[check][name]
+            entries[name] = entry
+        return entries
+
+
+def reference_targets(schema_data: dict) -> list[str]:
+    """
+    Return the names of the other schemas that *schema_data* references
+    through foreignKeys or weakForeignKeys.
+    """
+    targets = set()
+    for key in ('foreignKeys', 'weakForeignKeys'):
+        for fk in schema_data.get(key) or []:
+            ref = fk.get('reference') if isinstance(fk, dict) else None
+            resource = ref.get('resource') if isinstance(ref, dict) else None
+            if isinstance(resource, str) and resource.strip():
+                targets.add(resource.strip())
+    return sorted(targets)
+
+
+def plan_package(
+    package_file: Path,
+    package_data: dict,
+    declared_basenames: list[str],
+    documents: Documents,
+    result: ValidationResult,
+    manifest: Manifest | None = None,
+    signature: str = '',
+) -> Plan:
+    """
+    Hash each declared schema file with its index.json entry and compare with
+    the manifest. The schemas to check again are those that changed, or are
+    new or gone, plus every schema that reaches one of them through
+    foreignKeys or weakForeignKeys, since their foreign key checks depend on
+    it. Without a manifest every schema is checked.
+    """
+    key = f"{package_file.resolve()} {signature}"
+    previous = manifest.get(key) if manifest is not None else {}
+    index_entries = {
+        Path(entry['url']).stem: entry
+        for entry in package_data.get('tableSchemas', [])
+        if 'url' in entry
+    }
+
+    hashes: dict[str, str] = {}
+    targets: dict[str, list[str]] = {}
+    changed: set[str] = set()
+    for basename in declared_basenames:
+        file_path = schemas_dir(package_file) / basename
+        name = file_path.stem
+        digest = hashlib.sha256()
+        try:
+            digest.update(file_path.read_bytes())
+        except OSError:
+            # Reported by the schemas pass; a missing file is a content of its own
+            digest.update(b'\0')
+        digest.update(json.dumps(index_entries.get(name), sort_keys=True).encode('utf-8'))
+        hashes[name] = digest.hexdigest()
+
+        entry = previous.get(name)
+        if entry is not None and entry.get('hash') == hashes[name]:
+            targets[name] = entry.get('targets', [])
+        else:
+            changed.add(name)
+            data = documents.load(file_path, ValidationResult(echo=False))
+            targets[name] = reference_targets(data) if isinstance(data, dict) else []
+    # Schemas gone since the last run change what references to them find
+    changed |= set(previous) - set(hashes)
+
+    referrers: dict[str, set[str]] = {}
+    for name, names in targets.items():
+        for target in names:
+            referrers.setdefault(target, set()).add(name)
+    stale: set[str] = set()
+    pending = list(changed)
+    while pending:
+        name = pending.pop()
+        if name not in stale:
+            stale.add(name)
+            pending.extend(referrers.get(name, ()))
+
+    if previous:
+        to_check = len(stale & hashes.keys())
+        result.info(f"  Incremental: checking {to_check} of {len(hashes)} schemas, "
+                    f"reusing the results of the others")
+    return Plan(key, hashes, targets, previous, stale)
+
+
+def check_schemas_incrementally(
+    package_file: Path,
+    package_data: dict,
+    declared_basenames: list[str],
+    documents: Documents,
+    plan: Plan,
+    result: ValidationResult,
+    cross_check_properties: list[str] = (),
+) -> dict[str, dict]:
+    """
+    check_schema_json one schema at a time, reusing the messages of the
+    schemas that are not stale. Returns all the loaded schemas.
+    """
+    loaded: dict[str, dict] = {}
+    for basename in declared_basenames:
+        file_path = schemas_dir(package_file) / basename
+        messages = plan.cached('schemas', file_path.stem)
+        if messages is None:
+            schema_result = ValidationResult(echo=False)
+            loaded.update(check_schema_json(package_file, package_data, [basename], documents,
+                                            schema_result, cross_check_properties))
+            messages = schema_result.messages
+        else:
+            data = documents.load(file_path, ValidationResult(echo=False))
+            if data is not None:
+                loaded[file_path.stem] = data
+        plan.records['schemas'][file_path.stem] = messages
+        result.replay(messages)
+    return loaded
+
+
+def check_frictionless_incrementally(
+    loaded_schemas: dict[str, dict],
+    plan: Plan,
+    result: ValidationResult,
+) -> None:
+    """
+    Validate each schema descriptor against the Frictionless specification,
+    reusing the verdicts of the schemas that are not stale. Reports a summary
+    count.
+    """
+    valid_count = 0
+    for name, descriptor in loaded_schemas.items():
+        record = plan.cached('frictionless', name)
+        if record is None:
+            schema_result = ValidationResult(echo=False)
+            valid = check_frictionless_schema(name, descriptor, schema_result)
+            record = {'valid': valid, 'messages': schema_result.messages}
+        plan.records['frictionless'][name] = record
+        valid_count += record['valid']
+        result.replay(record['messages'])
+
+    result.info(f"  Frictionless: {valid_count}/{len(loaded_schemas)} schemas valid")
+
+
+def check_foreign_keys_incrementally(
+    loaded_schemas: dict[str, dict],
+    plan: Plan,
+    result: ValidationResult,
+) -> None:
+    """check_foreign_keys, reusing the messages of the schemas that are not stale."""
+    for name in loaded_schemas:
+        messages = plan.cached('foreign_keys', name)
+        if messages is None:
+            schema_result = ValidationResult(echo=False)
+            check_foreign_keys(loaded_schemas, schema_result, only={name})
+            messages = schema_result.messages
+        plan.records['foreign_keys'][name] = messages
+        result.replay(messages)
+
+
+def record_package(plan: Plan, manifest: Manifest) -> None:
+    """Store the records of this run of a package in the manifest."""
+    manifest.put(plan.key, plan.entries())
+
+
+# ---------------------------------------------------------------------------
+# Pass scheduling
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Pass:
+    """
+    One validation pass. *run* is called with the values named in *requires*
+    as keyword arguments and, if it *reports*, a ValidationResult as
+    *result*; what it returns becomes the value named *provides*. A pass is
+    skipped if any of its required values is None. It runs only once the
+    passes named in *after* have run or been skipped.
+    """
+    name: str
+    run: Callable
+    requires: tuple[str, ...] = ()
+    provides: str | None = None
+    after: tuple[str, ...] = ()
+    reports: bool = True
+
+
+class PackageRun:
+    """The state of the passes of one package: values so far and results."""
+
+    def __init__(self, package_file: Path, passes: list[Pass], documents: Documents):
+        self.values: dict[str, object] = {'package_file': package_file, 'documents': documents}
+        self.pending = list(passes)
+        self.results: dict[str, ValidationResult] = {}
+        self.order = [p.name for p in passes]
+        self.running = 0
+        # Names of the passes that have run or been skipped
+        self.finished: set[str] = set()
+
+    def ready(self) -> list[Pass]:
+        """
+        Take the pending passes whose inputs are all known and whose *after*
+        passes are finished; skip those with a missing input, which in turn
+        makes the values they provide missing.
+        """
+        ready = []
+        progress = True
+        while progress:
+            progress = False
+            for p in list(self.pending):
+                if not all(name in self.values for name in p.requires):
+                    continue
+                if not self.finished.issuperset(p.after):
+                    continue
+                self.pending.remove(p)
+                progress = True
+                if any(self.values[name] is None for name in p.requires):
+                    self.finished.add(p.name)
+                    if p.provides is not None:
+                        self.values[p.provides] = None
+                else:
+                    ready.append(p)
+        return ready
+
+    @property
+    def done(self) -> bool:
+        return not self.pending and not self.running
+
+
+def validate_packages(
+    package_files: list[Path],
+    passes: list[Pass],
+    result: ValidationResult,
+    jobs: int | None = None,
+) -> None:
+    """
+    Run *passes* on every package, concurrently in a pool of *jobs* threads,
+    and record their messages in *result* package by package.
+    """
+    documents = Documents()
+    runs = [PackageRun(package_file, passes, documents) for package_file in package_files]
+    in_flight = {}
+    reported = 0
+
+    def report(run: PackageRun) -> None:
+        for name in run.order:
+            if name in run.results:
+                result.merge(run.results[name])
+
+    def start(executor, run: PackageRun) -> None:
+        for p in run.ready():
+            args = {name: run.values[name] for name in p.requires}
+            if p.reports:
+                args['result'] = run.results[p.name] = ValidationResult(echo=False)
+            in_flight[executor.submit(p.run, **args)] = (run, p)
+            run.running += 1
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for run in runs:
+            start(executor, run)
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                run, p = in_flight.pop(future)
+                run.running -= 1
+                run.finished.add(p.name)
+                value = future.result()
+                if p.provides is not None:
+                    run.values[p.provides] = value
+                start(executor, run)
+            # Report the packages that are complete, in order
+            while reported < len(runs) and runs[reported].done:
+                report(runs[reported])
+                reported += 1
+    # Packages with no passes to run at all
+    for run in runs[reported:]:
+        report(run)
+
+
+def standard_passes(
+    strict: bool = False,
+    cross_check_properties: list[str] = (),
+    checker: UrlChecker | None = None,
+    manifest: Manifest | None = None,
+) -> list[Pass]:
+    """
+    The passes of the validation scripts: index.json structure, schema JSON
+    and field metadata, Frictionless descriptors and foreign keys, plus URL
+    reachability if a *checker* is given. *strict* and
+    *cross_check_properties* are passed on to check_index_json and
+    check_schema_json. With a *manifest*, only the schemas changed since the
+    run that wrote it, and those that reach them, are checked again.
+    """
+    # Records of runs with other checks do not apply to this one
+    signature = json.dumps([MANIFEST_VERSION, version('frictionless'), strict,
+                            list(cross_check_properties), REQUIRED_FIELD_PROPERTIES])
+    passes = [
+        Pass('package', load_package, ('package_file', 'documents'), 'package_data'),
+    ]
+    if checker is not None:
+        passes.append(Pass('urls', functools.partial(check_urls_are_resolvable, checker=checker),
+                           ('package_data',)))
+    passes += [
+        Pass('index', functools.partial(declared_schemas, strict=strict),
+             ('package_file', 'package_data'), 'declared_basenames'),
+        Pass('plan', functools.partial(plan_package, manifest=manifest, signature=signature),
+             ('package_file', 'package_data', 'declared_basenames', 'documents'), 'plan'),
+        Pass('schemas', functools.partial(check_schemas_incrementally,
+                                          cross_check_properties=cross_check_properties),
+             ('package_file', 'package_data', 'declared_basenames', 'documents', 'plan'), 'loaded_schemas'),
+        Pass('frictionless', check_frictionless_incrementally, ('loaded_schemas', 'plan')),
+        Pass('foreign_keys', check_foreign_keys_incrementally, ('loaded_schemas', 'plan')),
+    ]
+    if manifest is not None:
+        passes.append(Pass('manifest', functools.partial(record_package, manifest=manifest), ('plan',),
+                           after=('schemas', 'frictionless', 'foreign_keys'), reports=False))
+    return passes
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def url_mapping(value: str) -> tuple[str, Path]:
+    """Parse a PREFIX=DIR --url-map argument."""
+    prefix, sep, directory = value.rpartition('=')
+    if not sep or not prefix or not directory:
+        raise argparse.ArgumentTypeError(f"expected PREFIX=DIR, got {value!r}")
+    if not os.path.isdir(directory):
+        raise argparse.ArgumentTypeError(f"not a directory: {directory!r}")
+    return prefix, Path(directory)
+
+
+def add_engine_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="Passes to run at a time (default: number of CPUs)")
+    parser.add_argument('--manifest', type=Path, default=MANIFEST_FILE,
+                        help=f"File recording the schemas checked and their results, so that "
+                             f"the next run checks only what changed (default: {MANIFEST_FILE})")
+    parser.add_argument('--full', action='store_true',
+                        help="Check every schema, without reading or writing the manifest")
+
+
+def open_manifest(args: argparse.Namespace) -> Manifest | None:
+    """Return the Manifest configured by the arguments of add_engine_arguments."""
+    return None if args.full else Manifest(args.manifest)
+
+
+def add_url_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--url-concurrency', type=int, default=URL_CONCURRENCY,
+                        help=f"URLs to check at a time (default: {URL_CONCURRENCY})")
+    parser.add_argument('--host-concurrency', type=int, default=URL_HOST_CONCURRENCY,
+                        help=f"Requests in flight at a time to any one host "
+                             f"(default: {URL_HOST_CONCURRENCY})")
+    parser.add_argument('--host-rate', type=float,
+                        help="Requests started per second to any one host (default: no limit)")
+    parser.add_argument('--url-timeout', type=float, default=URL_TIMEOUT,
+                        help=f"Seconds to wait for each URL (default: {URL_TIMEOUT})")
+    parser.add_argument('--url-cache', type=Path, default=URL_CACHE_FILE,
+                        help=f"File keeping URL check outcomes between runs (default: {URL_CACHE_FILE})")
+    parser.add_argument('--url-cache-ttl', type=float, default=URL_CACHE_TTL,
+                        help=f"Seconds for which a reachable URL is not checked again "
+                             f"(default: {URL_CACHE_TTL})")
+    parser.add_argument('--no-url-cache', action='store_true',
+                        help="Check every URL over the network, and keep no outcomes")
+    parser.add_argument('--url-map', type=url_mapping, action='append', default=[],
+                        metavar='PREFIX=DIR',
+                        help="Check URLs starting with PREFIX as files in DIR instead of over "
+                             "the network (repeatable), e.g. https://rs.gbif.org/sandbox/"
+                             "experimental/data-packages/dwc-dp/0.1/=../dwc-dp")
+
+
+def check_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Reject the values of the engine and URL arguments that cannot work."""
+    for name in ('jobs', 'url_concurrency', 'host_concurrency'):
+        if getattr(args, name, 1) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+    if getattr(args, 'host_rate', None) is not None and args.host_rate <= 0:
+        parser.error("--host-rate must be positive")
+
+
+def url_checker(args: argparse.Namespace) -> UrlChecker:
+    """Return the UrlChecker configured by the arguments of add_url_arguments."""
+    cache = UrlCache(None if args.no_url_cache else args.url_cache, args.url_cache_ttl)
+    return UrlChecker(args.url_concurrency, args.host_concurrency,
+                      args.host_rate, args.url_timeout, cache, args.url_map)
+
+
+def run(
+    directories: list[str],
+    passes: list[Pass],
+    jobs: int | None = None,
+    descriptor: str = 'index.json',
+) -> int:
+    """
+    Validate every package under *directories*, found by its *descriptor*
+    file, with *passes*, print the summary, and return the process exit code.
+    """
+    result = ValidationResult()
+
+    package_files = find_package_files(directories, descriptor)
+    if not package_files:
+        print(f"No {descriptor} files found under: {directories}")
+        return 1
+
+    validate_packages(sorted(package_files), passes, result, jobs)
+
+    print()
+    if result.has_errors:
+        print(f"Validation failed: {len(result.errors)} error(s), "
+              f"{len(result.warnings)} warning(s).")
+        return 1
+
+    warning_note = f" ({len(result.warnings)} warning(s))" if result.warnings else ""
+    print(f"All validations passed{warning_note}.")
+    return 0